@@ -6,13 +6,17 @@ HackFax × PatriotHacks 2026
 """
 
 import os
+import json
 import base64
+import asyncio
+import binascii
 from contextlib import asynccontextmanager
 from datetime import datetime
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response, JSONResponse
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -21,9 +25,23 @@ load_dotenv()
 from models.schemas import (
     ClassificationRequest, ChatRequest, ChatResponse,
     VoiceRequest, UserCreate, ScoreAction,
-    PledgeCreate,
+    PledgeCreate, RouteBatchRequest,
 )
-from services import gemini, elevenlabs, mongodb, patriotai
+from services import (
+    gemini, elevenlabs, mongodb, patriotai,
+    classification_cache, imaging, chat_sessions, chat_cache, daily_tip,
+    audio_cache, http_client, score_audio, score_buffer, rank_index,
+    read_cache, intent_model, dashboard,
+)
+
+# Largest image we'll classify, and the read size for multipart uploads
+CLASSIFY_MAX_IMAGE_BYTES = int(os.getenv("CLASSIFY_MAX_IMAGE_BYTES", str(8 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 64 * 1024
+
+# Batch classification (bin audits)
+CLASSIFY_BATCH_MAX_IMAGES = int(os.getenv("CLASSIFY_BATCH_MAX_IMAGES", "50"))
+CLASSIFY_BATCH_CONCURRENCY = int(os.getenv("CLASSIFY_BATCH_CONCURRENCY", "4"))
+CLASSIFY_BATCH_MAX_PACK_SIZE = 8
 
 
 # ── App Lifecycle ───────────────────────────────────────────────
@@ -33,9 +51,24 @@ async def lifespan(app: FastAPI):
     """Startup and shutdown events."""
     # Startup
     await mongodb.connect()
+    await rank_index.start()
+    score_buffer.start()
+    http_client.start()
+    classification_cache.load()
+    intent_model.train()
+    imaging.start_pool()
+    await daily_tip.start()
+    score_audio.start()
     print("🌿 GreenMason backend is running!")
     yield
     # Shutdown
+    await daily_tip.stop()
+    await score_audio.stop()
+    classification_cache.save()
+    imaging.stop_pool()
+    await http_client.stop()
+    await score_buffer.stop()
+    await rank_index.stop()
     await mongodb.disconnect()
 
 
@@ -48,6 +81,53 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Upload size limit — reject oversized classify bodies before they are
+# parsed: up front from Content-Length, and for chunked uploads as soon as
+# the bytes received pass the limit. Plain ASGI so other routes (and the
+# streaming responses) go straight through. Registered before CORS so CORS
+# stays outermost and the 413 still carries CORS headers.
+def _classify_body_limit(path: str) -> int:
+    # base64 JSON bodies are 4/3 the image size, plus some envelope
+    limit = CLASSIFY_MAX_IMAGE_BYTES * 4 // 3 + 64 * 1024
+    if path == "/api/classify/batch":
+        limit *= CLASSIFY_BATCH_MAX_IMAGES
+    return limit
+
+
+class ClassifyBodyLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith("/api/classify"):
+            await self.app(scope, receive, send)
+            return
+
+        limit = _classify_body_limit(scope["path"])
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": "Image too large"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised into the body parser, so it surfaces as a normal 413
+                    raise HTTPException(status_code=413, detail="Image too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(ClassifyBodyLimitMiddleware)
+
+
 # CORS — allow frontend
 origins = [
     "http://localhost:3000",
@@ -79,8 +159,10 @@ async def root():
         "endpoints": {
             "classify": "/api/classify",
             "chat": "/api/chat",
+            "chat_stream": "/api/chat/stream",
             "voice": "/api/voice/tip",
             "leaderboard": "/api/leaderboard",
+            "dashboard": "/api/dashboard/{username}",
             "pledges": "/api/pledges",
             "patriotai": "/api/patriotai/agents",
             "stats": "/api/stats",
@@ -93,10 +175,57 @@ async def health():
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
 
+@app.get("/api/metrics")
+async def metrics():
+    """Cache and upstream performance counters for this worker."""
+    return {
+        "classification_cache": classification_cache.stats(),
+        "image_normalization": imaging.stats(),
+        "chat_sessions": chat_sessions.stats(),
+        "chat_compaction": gemini.compaction_stats(),
+        "chat_cache": chat_cache.stats(),
+        "tts_cache": audio_cache.stats(),
+        "score_audio": score_audio.stats(),
+        "score_writes": score_buffer.stats(),
+        "rank_index": rank_index.stats(),
+        "read_cache": read_cache.stats(),
+        "intent_model": intent_model.stats(),
+        "http_client": http_client.stats(),
+    }
+
+
 # ═══════════════════════════════════════════════════════════════
 # 1. SNAP & SORT — Waste Classification (Gemini Vision)
 # ═══════════════════════════════════════════════════════════════
 
+def _check_image(header: bytes | memoryview) -> str:
+    """Reject non-images early; returns the sniffed MIME type."""
+    mime_type = imaging.sniff_image_type(header)
+    if not mime_type:
+        raise HTTPException(status_code=415, detail="Unsupported or non-image payload")
+    return mime_type
+
+
+async def _read_upload(file: UploadFile) -> bytes:
+    """
+    Read an upload in chunks, failing fast on non-images and on anything
+    over CLASSIFY_MAX_IMAGE_BYTES. The chunks are joined once into the
+    bytes handed to Gemini — no intermediate base64 or bytearray copies.
+    """
+    chunks = []
+    size = 0
+    while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+        if not chunks:
+            _check_image(chunk)
+        size += len(chunk)
+        if size > CLASSIFY_MAX_IMAGE_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large")
+        chunks.append(chunk)
+    if not chunks:
+        raise HTTPException(status_code=400, detail="Empty upload")
+    return chunks[0] if len(chunks) == 1 else b"".join(chunks)
+
+
 @app.post("/api/classify")
 async def classify_waste(request: ClassificationRequest):
     """
@@ -109,8 +238,22 @@ async def classify_waste(request: ClassificationRequest):
     - Points earned
     """
     try:
-        result = await gemini.classify_waste(request.image_base64, request.mime_type)
+        if len(request.image_base64) * 3 // 4 > CLASSIFY_MAX_IMAGE_BYTES:
+            raise HTTPException(status_code=413, detail="Image too large")
+        try:
+            image_bytes = base64.b64decode(request.image_base64, validate=True)
+        except (binascii.Error, ValueError):
+            raise HTTPException(status_code=400, detail="image_base64 is not valid base64")
+        mime_type = _check_image(image_bytes)
+
+        result = await gemini.classify_waste(image_bytes, mime_type)
         return result
+    except HTTPException:
+        raise
+    except gemini.GeminiBusyError:
+        raise HTTPException(status_code=503, detail="Classification is busy, try again shortly")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Classification timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Classification failed: {str(e)}")
 
@@ -122,20 +265,146 @@ async def classify_waste_upload(file: UploadFile = File(...)):
     Alternative to base64 — accepts multipart file upload.
     """
     try:
-        contents = await file.read()
-        image_base64 = base64.b64encode(contents).decode("utf-8")
-        mime_type = file.content_type or "image/jpeg"
+        image_bytes = await _read_upload(file)
+        mime_type = _check_image(image_bytes)
 
-        result = await gemini.classify_waste(image_base64, mime_type)
+        result = await gemini.classify_waste(image_bytes, mime_type)
         return result
+    except HTTPException:
+        raise
+    except gemini.GeminiBusyError:
+        raise HTTPException(status_code=503, detail="Classification is busy, try again shortly")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Classification timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Classification failed: {str(e)}")
 
 
+@app.post("/api/classify/batch")
+async def classify_waste_batch(request: Request, pack_size: int = 1):
+    """
+    Classify a batch of uploaded photos (e.g. a bin audit).
+
+    Send a multipart form with up to CLASSIFY_BATCH_MAX_IMAGES `files`.
+    Results stream back as NDJSON, one line per image as soon as it is
+    classified (completion order, tagged with its index), then a summary
+    line. `pack_size` > 1 packs that many images into each Gemini prompt.
+    """
+    # Parse the form ourselves: FastAPI closes form files when the handler
+    # returns, but we read them lazily while the response streams.
+    form = await request.form(max_files=CLASSIFY_BATCH_MAX_IMAGES)
+    files = [f for f in form.getlist("files") if not isinstance(f, str)]
+    if not files:
+        await form.close()
+        raise HTTPException(status_code=400, detail="No files uploaded")
+
+    pack_size = max(1, min(pack_size, CLASSIFY_BATCH_MAX_PACK_SIZE))
+    groups = [range(i, min(i + pack_size, len(files))) for i in range(0, len(files), pack_size)]
+    slots = asyncio.Semaphore(CLASSIFY_BATCH_CONCURRENCY)
+
+    async def classify_group(indices) -> list[dict]:
+        async with slots:
+            lines, images = [], []
+            for index in indices:
+                try:
+                    image_bytes = await _read_upload(files[index])
+                    images.append((index, image_bytes, _check_image(image_bytes)))
+                except HTTPException as e:
+                    lines.append({"index": index, "filename": files[index].filename, "error": e.detail})
+
+            error = None
+            results = []
+            try:
+                if len(images) == 1:
+                    _, image_bytes, mime_type = images[0]
+                    results = [await gemini.classify_waste(image_bytes, mime_type)]
+                elif images:
+                    results = await gemini.classify_waste_packed(
+                        [(image_bytes, mime_type) for _, image_bytes, mime_type in images]
+                    )
+            except gemini.GeminiBusyError:
+                error = "Classification is busy, try again shortly"
+            except asyncio.TimeoutError:
+                error = "Classification timed out"
+            except Exception as e:
+                error = f"Classification failed: {str(e)}"
+
+            for position, (index, _, _) in enumerate(images):
+                line = {"index": index, "filename": files[index].filename}
+                if error:
+                    line["error"] = error
+                else:
+                    line["result"] = results[position]
+                lines.append(line)
+            return lines
+
+    async def stream_results():
+        tasks = [asyncio.create_task(classify_group(group)) for group in groups]
+        classified = failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                for line in await next_done:
+                    if "error" in line:
+                        failed += 1
+                    else:
+                        classified += 1
+                    yield json.dumps(line) + "\n"
+            yield json.dumps({"done": True, "classified": classified, "failed": failed}) + "\n"
+        finally:
+            for task in tasks:
+                task.cancel()  # client went away mid-batch
+            await form.close()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
 # ═══════════════════════════════════════════════════════════════
 # 2. ECOCHAT — Sustainability Chat (Gemini + PatriotAI Routing)
 # ═══════════════════════════════════════════════════════════════
 
+def _route_message(message: str) -> tuple[dict | None, bool]:
+    """
+    Local routing for a chat message, and whether Gemini still needs the
+    routing rules. A confident intent model decides the route itself (so
+    the rules are left out of the prompt), including a confident "no
+    route"; otherwise keyword detection decides. The model isn't run at
+    all while its routing is off.
+    """
+    if not intent_model.routing_enabled():
+        return patriotai.detect_patriotai_route(message), True
+    intent = intent_model.classify(message)
+    if not intent["confident"]:
+        return patriotai.detect_patriotai_route(message), True
+    agent_key = intent["agent_key"]
+    if agent_key is None:
+        return None, False
+    route_info = patriotai.detect_patriotai_route(message)
+    if route_info is None or route_info["agent_key"] != agent_key:
+        route_info = patriotai.agent_route(agent_key)
+    return route_info, False
+
+
+def _merge_patriotai_route(result: dict, route_info: dict | None) -> dict:
+    """Prefer Gemini's routing tag; fall back to local routing."""
+    if not result["route_to_patriotai"] and route_info:
+        result["route_to_patriotai"] = True
+        result["patriotai_agent"] = route_info["agent_key"]
+        result["patriotai_reason"] = (
+            f"{route_info['agent_emoji']} For the best answer, try "
+            f"{route_info['agent_name']} on PatriotAI — "
+            f"{route_info['agent_description']}"
+        )
+    return result
+
+
+SESSION_EXPIRED_DETAIL = "Chat session expired; resend the conversation history"
+
+
+def _sse(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
@@ -148,97 +417,311 @@ async def chat(request: ChatRequest):
     """
     try:
         # First check if we should route to PatriotAI
-        route_info = patriotai.detect_patriotai_route(request.message)
+        route_info, routing_rules = _route_message(request.message)
 
-        # Get Gemini response (it also has routing logic in its system prompt)
+        # Continue the server-side session (clients only send the new message)
         history = [{"role": m.role, "content": m.content} for m in request.history]
-        result = await gemini.eco_chat(request.message, history)
-
-        # Merge routing info (prefer Gemini's detection, fallback to keyword detection)
-        if not result["route_to_patriotai"] and route_info:
-            result["route_to_patriotai"] = True
-            result["patriotai_agent"] = route_info["agent_key"]
-            result["patriotai_reason"] = (
-                f"{route_info['agent_emoji']} For the best answer, try "
-                f"{route_info['agent_name']} on PatriotAI — "
-                f"{route_info['agent_description']}"
-            )
-
+        session = await chat_sessions.get_or_create(request.session_id, history)
+
+        # Common first questions are answered from the FAQ cache
+        first_turn = not session.turns
+        result = chat_cache.get(request.message) if first_turn else None
+        if result is None:
+            # Get Gemini response (routing rules stay in its prompt unless already routed)
+            result = await gemini.eco_chat(request.message, session, routing_rules)
+            result = _merge_patriotai_route(result, route_info)
+            if first_turn:
+                chat_cache.put(request.message, result)
+
+        await chat_sessions.append_exchange(session, request.message, result["reply"])
+        result["session_id"] = session.session_id
         return ChatResponse(**result)
+    except chat_sessions.SessionExpiredError:
+        raise HTTPException(status_code=409, detail=SESSION_EXPIRED_DETAIL)
+    except gemini.GeminiBusyError:
+        raise HTTPException(status_code=503, detail="Chat is busy, try again shortly")
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Chat timed out")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Streaming EcoChat over Server-Sent Events.
+
+    Emits `token` events ({"text": ...}) as Gemini generates the reply,
+    with [ROUTE:...] tags already stripped, then a single `done` event
+    carrying the full ChatResponse (routing merged with keyword detection).
+    Failures mid-stream arrive as an `error` event; an expired session is
+    a 409 before the stream starts, as with /api/chat.
+    """
+    route_info, routing_rules = _route_message(request.message)
+    history = [{"role": m.role, "content": m.content} for m in request.history]
+    try:
+        session = await chat_sessions.get_or_create(request.session_id, history)
+    except chat_sessions.SessionExpiredError:
+        raise HTTPException(status_code=409, detail=SESSION_EXPIRED_DETAIL)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat failed: {str(e)}")
 
+    async def events():
+        try:
+            first_turn = not session.turns
+            result = chat_cache.get(request.message) if first_turn else None
+            if result is not None:
+                yield _sse("token", {"text": result["reply"]})
+            else:
+                async for kind, payload in gemini.eco_chat_stream(request.message, session, routing_rules):
+                    if kind == "token":
+                        yield _sse("token", {"text": payload})
+                    else:
+                        result = _merge_patriotai_route(payload, route_info)
+                if first_turn:
+                    chat_cache.put(request.message, result)
+
+            await chat_sessions.append_exchange(session, request.message, result["reply"])
+            result["session_id"] = session.session_id
+            yield _sse("done", ChatResponse(**result).model_dump())
+        except gemini.GeminiBusyError:
+            yield _sse("error", {"detail": "Chat is busy, try again shortly"})
+        except asyncio.TimeoutError:
+            yield _sse("error", {"detail": "Chat timed out"})
+        except Exception as e:
+            yield _sse("error", {"detail": f"Chat failed: {str(e)}"})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 
 # ═══════════════════════════════════════════════════════════════
 # 3. VOICE — Text-to-Speech (ElevenLabs)
 # ═══════════════════════════════════════════════════════════════
 
+def _etag_matches(request: Request, etag: str) -> bool:
+    """True if the client's If-None-Match already names this ETag."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip().removeprefix("W/") for tag in header.split(",")]
+    return etag in tags
+
+
+def _byte_range(range_header: str, size: int) -> tuple[int, int] | None:
+    """
+    Parse a single `bytes=start-end` range into inclusive offsets.
+    Returns None for anything we don't serve partially (malformed headers,
+    multiple ranges, other units), which RFC 9110 says to ignore, and
+    raises ValueError for a well-formed range that can't be satisfied.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start, sep, end = (part.strip() for part in spec.strip().partition("-"))
+    if not sep or (start and not start.isdecimal()) or (end and not end.isdecimal()):
+        return None
+    if not start:  # suffix range: the last N bytes
+        if not end:
+            return None
+        length = int(end)
+        if length <= 0:
+            raise ValueError("empty suffix range")
+        return max(0, size - length), size - 1
+    first = int(start)
+    if end and int(end) < first:
+        return None  # invalid, not just unsatisfiable
+    if first >= size:
+        raise ValueError("range not satisfiable")
+    last = min(int(end), size - 1) if end else size - 1
+    return first, last
+
+
+def _audio_response(request: Request, audio: bytes, etag: str, filename: str, headers: dict = None) -> Response:
+    """
+    Serve MP3 bytes with ETag revalidation (304) and single byte-range
+    requests (206), which is what <audio> elements send when seeking or
+    replaying.
+    """
+    headers = {
+        **(headers or {}),
+        "ETag": etag,
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f"inline; filename={filename}",
+    }
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (not if_range or if_range.strip() == etag):
+        try:
+            span = _byte_range(range_header, len(audio))
+        except ValueError:
+            return Response(
+                status_code=416,
+                headers={**headers, "Content-Range": f"bytes */{len(audio)}"},
+            )
+        if span:
+            first, last = span
+            return Response(
+                content=audio[first:last + 1],
+                status_code=206,
+                media_type="audio/mpeg",
+                headers={**headers, "Content-Range": f"bytes {first}-{last}/{len(audio)}"},
+            )
+
+    return Response(content=audio, media_type="audio/mpeg", headers=headers)
+
+
+async def _streaming_audio_response(chunks, etag: str, filename: str, headers: dict = None) -> Response:
+    """
+    Relay synthesized MP3 chunks as they arrive. The first chunk is awaited
+    here so upstream errors still become a normal HTTP error response.
+    """
+    try:
+        first = await anext(chunks)
+    except StopAsyncIteration:
+        first = b""
+    except BaseException:
+        await chunks.aclose()
+        raise
+
+    async def body():
+        try:
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type="audio/mpeg",
+        headers={
+            **(headers or {}),
+            "ETag": etag,
+            "Content-Disposition": f"inline; filename={filename}",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+async def _speech_response(request: Request, text: str, etag: str, filename: str, headers: dict, stream: bool) -> Response:
+    # Cached audio is served whole (with Range support) even in streaming
+    # mode; only a cache miss is worth streaming.
+    if stream and not audio_cache.contains(etag.strip('"')):
+        return await _streaming_audio_response(
+            elevenlabs.text_to_speech_stream(text), etag, filename, headers
+        )
+    audio_bytes = await elevenlabs.text_to_speech(text)
+    return _audio_response(request, audio_bytes, etag, filename, headers)
+
+
 @app.post("/api/voice/speak")
-async def voice_speak(request: VoiceRequest):
-    """Convert text to speech. Returns MP3 audio."""
+async def voice_speak(request: VoiceRequest, http_request: Request, stream: bool = False):
+    """
+    Convert text to speech. Returns MP3 audio.
+    The audio is cached by content; the same clip can be replayed (with
+    Range support) from the URL in the Content-Location header.
+    Pass ?stream=true to start receiving audio while it is synthesized.
+    """
     try:
-        audio_bytes = await elevenlabs.text_to_speech(request.text)
-        return Response(
-            content=audio_bytes,
-            media_type="audio/mpeg",
-            headers={"Content-Disposition": "inline; filename=greenmason_voice.mp3"}
+        key = elevenlabs.speech_key(request.text)
+        etag = f'"{key}"'
+        headers = {"Content-Location": f"/api/voice/audio/{key}"}
+        if _etag_matches(http_request, etag):
+            return Response(status_code=304, headers={**headers, "ETag": etag})
+
+        return await _speech_response(
+            http_request, request.text, etag, "greenmason_voice.mp3", headers, stream
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Voice generation failed: {str(e)}")
 
 
+@app.get("/api/voice/audio/{key}")
+async def voice_cached_audio(key: str, request: Request):
+    """Replay previously synthesized audio by its content key."""
+    etag = f'"{key}"'
+    headers = {"Cache-Control": "public, max-age=31536000, immutable"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers={**headers, "ETag": etag})
+
+    audio_bytes = await audio_cache.get(key) if key.isalnum() else None
+    if audio_bytes is None:
+        raise HTTPException(status_code=404, detail="Audio not found")
+    return _audio_response(request, audio_bytes, etag, "greenmason_voice.mp3", headers)
+
+
+def _tip_headers(tip: dict) -> dict:
+    return {
+        "ETag": tip["etag"],
+        "Cache-Control": f"public, max-age={daily_tip.cache_max_age()}",
+    }
+
+
 @app.get("/api/voice/tip")
-async def voice_daily_tip():
-    """Get a daily sustainability tip as audio."""
+async def voice_daily_tip(request: Request):
+    """Get a daily sustainability tip as audio (pre-generated once a day)."""
     try:
-        # Generate tip text
-        tip_text = await gemini.generate_daily_tip()
-
-        # Convert to speech
-        audio_bytes = await elevenlabs.text_to_speech(tip_text)
-
-        return Response(
-            content=audio_bytes,
-            media_type="audio/mpeg",
-            headers={
-                "Content-Disposition": "inline; filename=daily_tip.mp3",
-                "X-Tip-Text": tip_text.replace("\n", " ")[:200],
-            }
+        tip = await daily_tip.get_tip()
+        return _audio_response(
+            request,
+            tip["audio"],
+            tip["etag"],
+            "daily_tip.mp3",
+            {
+                **_tip_headers(tip),
+                "X-Tip-Text": tip["text"].replace("\n", " ")[:200],
+            },
         )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Daily tip timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Daily tip failed: {str(e)}")
 
 
 @app.get("/api/voice/tip/text")
-async def voice_daily_tip_text():
+async def voice_daily_tip_text(request: Request):
     """Get a daily sustainability tip as text only (no audio)."""
     try:
-        tip_text = await gemini.generate_daily_tip()
-        return {"tip": tip_text}
+        tip = await daily_tip.get_tip()
+        headers = _tip_headers(tip)
+        if _etag_matches(request, tip["etag"]):
+            return Response(status_code=304, headers=headers)
+        return JSONResponse(content={"tip": tip["text"]}, headers=headers)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Tip generation timed out")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Tip generation failed: {str(e)}")
 
 
 @app.get("/api/voice/score/{username}")
-async def voice_score_summary(username: str):
-    """Get an audio summary of a user's Green Score."""
+async def voice_score_summary(username: str, request: Request):
+    """Get an audio summary of a user's Green Score (spliced from cached clips)."""
     try:
         user = await mongodb.get_user(username)
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
 
-        rank = await mongodb.get_user_rank(username)
+        rank = await rank_index.get_user_rank(username, user["total_score"])
         display_name = user.get("display_name", username)
 
-        audio_bytes = await elevenlabs.generate_score_summary_audio(
-            display_name, user["total_score"], rank
-        )
+        # The segments decide the audio, so a client holding the current
+        # version revalidates without anything being rendered.
+        etag = score_audio.summary_etag(display_name, user["total_score"], rank)
+        headers = {"Cache-Control": "no-cache"}
+        if _etag_matches(request, etag):
+            return Response(status_code=304, headers={**headers, "ETag": etag})
 
-        return Response(
-            content=audio_bytes,
-            media_type="audio/mpeg",
-            headers={"Content-Disposition": "inline; filename=score_summary.mp3"}
-        )
+        audio_bytes = await score_audio.render(display_name, user["total_score"], rank)
+        return _audio_response(request, audio_bytes, etag, "score_summary.mp3", headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -254,6 +737,7 @@ async def create_user(request: UserCreate):
     """Create a new user or get existing one."""
     try:
         user = await mongodb.create_user(request.username, request.display_name)
+        rank_index.ensure_user(user["username"], user.get("display_name"))
         return user
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"User creation failed: {str(e)}")
@@ -266,16 +750,28 @@ async def get_user(username: str):
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    rank = await mongodb.get_user_rank(username)
+    rank = await rank_index.get_user_rank(username, user["total_score"])
     user["rank"] = rank
     return user
 
 
+@app.get("/api/dashboard/{username}")
+async def get_dashboard(username: str, leaderboard_limit: int = 20, actions_limit: int = 10):
+    """Profile, rank, badges, recent actions, leaderboard and global stats in one response."""
+    try:
+        data = await dashboard.get_dashboard(username, leaderboard_limit, actions_limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Dashboard failed: {str(e)}")
+    if data is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return jsonable_encoder(data)
+
+
 @app.post("/api/scores")
 async def log_score(request: ScoreAction):
     """Log a scoring action (sort, challenge, quiz, pledge, chat)."""
     try:
-        result = await mongodb.log_action(
+        result = await score_buffer.log_action(
             request.username, request.action, request.points, request.description
         )
         return result
@@ -283,12 +779,43 @@ async def log_score(request: ScoreAction):
         raise HTTPException(status_code=500, detail=f"Score logging failed: {str(e)}")
 
 
+def _cached_json(request: Request, content: dict, etag: str) -> Response:
+    """JSON response for a read_cache value, or 304 if the client has it."""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(content=jsonable_encoder(content), headers=headers)
+
+
 @app.get("/api/leaderboard")
-async def get_leaderboard(limit: int = 20):
+async def get_leaderboard(request: Request, limit: int = 20):
     """Get the campus-wide Green Score leaderboard."""
     try:
-        leaderboard = await mongodb.get_leaderboard(limit)
-        return {"leaderboard": leaderboard, "total_entries": len(leaderboard)}
+        leaderboard, etag = await read_cache.get_leaderboard(limit)
+        return _cached_json(
+            request, {"leaderboard": leaderboard, "total_entries": len(leaderboard)}, etag
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Leaderboard failed: {str(e)}")
+
+
+@app.get("/api/leaderboard/{window}")
+async def get_window_leaderboard(window: str, request: Request, limit: int = 20):
+    """Top users by points earned this day, week, month or semester."""
+    if window not in mongodb.LEADERBOARD_WINDOWS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown leaderboard window; use one of: {', '.join(mongodb.LEADERBOARD_WINDOWS)}",
+        )
+    try:
+        board, etag = await read_cache.get_window_leaderboard(window, limit)
+        content = {
+            "window": window,
+            "since": board["since"],
+            "leaderboard": board["leaderboard"],
+            "total_entries": len(board["leaderboard"]),
+        }
+        return _cached_json(request, content, etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Leaderboard failed: {str(e)}")
 
@@ -301,7 +828,13 @@ async def get_leaderboard(limit: int = 20):
 async def create_pledge(request: PledgeCreate):
     """Create a Love Pledge to Earth (Valentine's feature)."""
     try:
+        # Through the score buffer, so the running totals and rank see the points
+        await score_buffer.log_action(
+            request.username, "pledge", mongodb.PLEDGE_POINTS,
+            f"Love Pledge: {request.pledge_text[:50]}...",
+        )
         pledge = await mongodb.create_pledge(request.username, request.pledge_text)
+        read_cache.invalidate_pledges()
         pledge.pop("_id", None)
         return pledge
     except Exception as e:
@@ -309,15 +842,36 @@ async def create_pledge(request: PledgeCreate):
 
 
 @app.get("/api/pledges")
-async def get_pledges(limit: int = 50):
-    """Get the Love Letters to Earth wall."""
+async def get_pledges(request: Request, limit: int = 50, cursor: str = None):
+    """
+    Get the Love Letters to Earth wall, newest first.
+    Pass the returned next_cursor to load the next page.
+    """
+    limit = max(1, min(limit, 100))
     try:
-        pledges = await mongodb.get_pledges(limit)
-        return {"pledges": pledges, "total": len(pledges)}
+        (pledges, next_cursor), etag = await read_cache.get_pledges(limit, cursor)
+        return _cached_json(
+            request, {"pledges": pledges, "total": len(pledges), "next_cursor": next_cursor}, etag
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Pledge retrieval failed: {str(e)}")
 
 
+@app.post("/api/pledges/{pledge_id}/like")
+async def like_pledge(pledge_id: str):
+    """Like a pledge on the wall."""
+    try:
+        likes = await mongodb.like_pledge_by_id(pledge_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Pledge like failed: {str(e)}")
+    if likes is None:
+        raise HTTPException(status_code=404, detail="Pledge not found")
+    read_cache.invalidate_pledges()
+    return {"id": pledge_id, "likes": likes}
+
+
 # ═══════════════════════════════════════════════════════════════
 # 6. PATRIOTAI INTEGRATION
 # ═══════════════════════════════════════════════════════════════
@@ -343,16 +897,36 @@ async def route_to_patriotai(message: str = Form(...)):
     return {"should_route": False, "message": "No PatriotAI routing needed for this query."}
 
 
+@app.post("/api/patriotai/route/batch")
+async def route_batch(request: RouteBatchRequest):
+    """
+    Classify many messages with the local intent model (offline analysis).
+
+    Returns one {"agent_key", "confidence", "confident"} per message, in
+    order, plus how many messages went to each agent.
+    """
+    try:
+        results = await asyncio.to_thread(intent_model.classify_batch, request.messages)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Batch routing failed: {str(e)}")
+
+    counts = {}
+    for result in results:
+        key = result["agent_key"] or "none"
+        counts[key] = counts.get(key, 0) + 1
+    return {"count": len(results), "counts": counts, "results": results}
+
+
 # ═══════════════════════════════════════════════════════════════
 # 7. GLOBAL STATS
 # ═══════════════════════════════════════════════════════════════
 
 @app.get("/api/stats")
-async def get_stats():
+async def get_stats(request: Request):
     """Get global GreenMason statistics."""
     try:
-        stats = await mongodb.get_global_stats()
-        return stats
+        stats, etag = await read_cache.get_global_stats()
+        return _cached_json(request, stats, etag)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Stats failed: {str(e)}")
 
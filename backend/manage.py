@@ -0,0 +1,58 @@
+"""
+GreenMason maintenance commands.
+
+Usage (from backend/, with MONGODB_URI set):
+    python manage.py rebuild-counters
+    python manage.py backfill-rollups
+"""
+
+import asyncio
+import argparse
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+from services import mongodb
+
+
+async def rebuild_counters():
+    """Recompute /api/stats counters from the users, actions and pledges collections."""
+    counters = await mongodb.rebuild_counters()
+    print(
+        f"📊 Counters rebuilt: {counters['total_users']} users, "
+        f"{counters['total_actions']} actions, {counters['total_pledges']} pledges, "
+        f"{counters['total_points']} points"
+    )
+
+
+async def backfill_rollups():
+    """Build the daily score rollups behind /api/leaderboard/{window} from existing actions."""
+    count = await mongodb.backfill_rollups()
+    print(f"📈 Score rollups backfilled: {count} user-days")
+
+
+COMMANDS = {
+    "rebuild-counters": rebuild_counters,
+    "backfill-rollups": backfill_rollups,
+}
+
+
+async def run(command: str):
+    await mongodb.connect()
+    try:
+        await COMMANDS[command]()
+    finally:
+        await mongodb.disconnect()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GreenMason maintenance commands")
+    parser.add_argument("command", choices=sorted(COMMANDS))
+    args = parser.parse_args()
+    asyncio.run(run(args.command))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,7 +10,7 @@ from datetime import datetime
 class ClassificationRequest(BaseModel):
     """Request for image-based waste classification."""
     image_base64: str = Field(..., description="Base64-encoded image data")
-    mime_type: str = Field(default="image/jpeg", description="MIME type of the image")
+    mime_type: str = Field(default="image/jpeg", description="MIME type of the image (the type sniffed from the bytes wins)")
 
 
 class ClassificationResult(BaseModel):
@@ -35,7 +35,8 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     """Request for chat completion."""
     message: str = Field(..., description="User's message")
-    history: list[ChatMessage] = Field(default=[], description="Conversation history")
+    session_id: Optional[str] = Field(default=None, description="Server-side session to continue (history is then ignored; 409 if it has expired and no history was sent)")
+    history: list[ChatMessage] = Field(default=[], description="Conversation history (only used to seed a new session)")
 
 
 class ChatResponse(BaseModel):
@@ -44,13 +45,14 @@ class ChatResponse(BaseModel):
     route_to_patriotai: bool = Field(default=False, description="Whether to redirect to PatriotAI")
     patriotai_agent: Optional[str] = Field(default=None, description="Which PatriotAI agent to redirect to")
     patriotai_reason: Optional[str] = Field(default=None, description="Why we're redirecting")
+    session_id: Optional[str] = Field(default=None, description="Session to send with the next message")
 
 
 # ── Voice (ElevenLabs TTS) ──────────────────────────────────────
 
 class VoiceRequest(BaseModel):
     """Request for text-to-speech."""
-    text: str = Field(..., description="Text to convert to speech")
+    text: str = Field(..., max_length=5000, description="Text to convert to speech (long text is read in sentence chunks)")
 
 
 # ── Green Score & Leaderboard ───────────────────────────────────
@@ -58,7 +60,7 @@ class VoiceRequest(BaseModel):
 class UserCreate(BaseModel):
     """Create a new user."""
     username: str = Field(..., min_length=2, max_length=50)
-    display_name: Optional[str] = None
+    display_name: Optional[str] = Field(default=None, max_length=50)
 
 
 class ScoreAction(BaseModel):
@@ -102,3 +104,10 @@ class Pledge(BaseModel):
     pledge_text: str
     created_at: datetime
     likes: int = 0
+
+
+# ── PatriotAI ───────────────────────────────────────────────────
+
+class RouteBatchRequest(BaseModel):
+    """Messages to classify with the local intent model."""
+    messages: list[str] = Field(..., min_length=1, max_length=10000, description="Chat messages to route")
@@ -0,0 +1,195 @@
+"""Disk-backed, content-addressed cache for synthesized speech.
+
+Each MP3 is stored as <key>.mp3 under TTS_CACHE_DIR, where the key is a
+hash of everything that affects the audio (text, voice, model, voice
+settings — see elevenlabs.speech_key). Total size is capped at
+TTS_CACHE_MAX_BYTES with least-recently-used eviction; file mtimes track
+recency so the order survives restarts.
+"""
+
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Optional
+
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join(".cache", "tts"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+_index: Optional[OrderedDict] = None  # key -> size in bytes, LRU first
+_total_bytes = 0
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _path(key: str) -> str:
+    return os.path.join(TTS_CACHE_DIR, f"{key}.mp3")
+
+
+def _load_index():
+    """Scan the cache directory once, oldest files first."""
+    global _index, _total_bytes
+    os.makedirs(TTS_CACHE_DIR, exist_ok=True)
+    entries = []
+    for entry in os.scandir(TTS_CACHE_DIR):
+        if entry.is_file() and entry.name.endswith(".mp3"):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+    entries.sort()
+    _index = OrderedDict((key, size) for _, key, size in entries)
+    _total_bytes = sum(_index.values())
+    _evict()
+
+
+def _evict():
+    global _total_bytes
+    while _total_bytes > TTS_CACHE_MAX_BYTES and len(_index) > 1:
+        key, size = _index.popitem(last=False)
+        _total_bytes -= size
+        _stats["evictions"] += 1
+        try:
+            os.remove(_path(key))
+        except FileNotFoundError:
+            pass
+
+
+def _read_file(key: str) -> Optional[bytes]:
+    try:
+        with open(_path(key), "rb") as f:
+            data = f.read()
+        os.utime(_path(key))  # recency for the next restart
+        return data
+    except FileNotFoundError:
+        return None
+
+
+def _tmp_path(key: str) -> str:
+    return f"{_path(key)}.{os.getpid()}.{time.monotonic_ns()}.tmp"
+
+
+def _write_file(key: str, data: bytes):
+    tmp_path = _tmp_path(key)
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, _path(key))
+
+
+def _add(key: str, size: int):
+    global _total_bytes
+    _total_bytes += size - _index.get(key, 0)
+    _index[key] = size
+    _index.move_to_end(key)
+    _evict()
+
+
+def _ensure_index():
+    if _index is None:
+        _load_index()
+
+
+def contains(key: str) -> bool:
+    _ensure_index()
+    return key in _index
+
+
+async def get(key: str) -> Optional[bytes]:
+    """
+    Cached audio for a key, or None. File IO runs in a thread; the index
+    is only touched on the event loop.
+    """
+    global _total_bytes
+    _ensure_index()
+    data = await asyncio.to_thread(_read_file, key) if key in _index else None
+    if data is None:
+        _total_bytes -= _index.pop(key, 0)  # file vanished under us
+        _stats["misses"] += 1
+        return None
+    if key in _index:
+        _index.move_to_end(key)
+    _stats["hits"] += 1
+    return data
+
+
+async def put(key: str, data: bytes):
+    _ensure_index()
+    try:
+        await asyncio.to_thread(_write_file, key, data)
+    except OSError as e:
+        print(f"⚠️ Could not cache TTS audio: {e}")
+        return
+    _add(key, len(data))
+
+
+class StreamWriter:
+    """
+    Fill the cache from audio that is being streamed to a client.
+
+    Chunks go to a temp file as they pass through, so memory stays at one
+    chunk; commit() publishes the file only once the stream completed, and
+    abort() throws a partial one away. A disk error stops caching but
+    never the stream itself.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.size = 0
+        self._tmp_path = None
+        self._file = None
+        self._failed = False
+
+    def _open(self):
+        _ensure_index()
+        self._tmp_path = _tmp_path(self.key)
+        self._file = open(self._tmp_path, "wb")
+
+    def _close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def _discard(self):
+        self._close()
+        if self._tmp_path:
+            try:
+                os.remove(self._tmp_path)
+            except FileNotFoundError:
+                pass
+
+    async def write(self, chunk: bytes):
+        if self._failed:
+            return
+        try:
+            if self._file is None:
+                await asyncio.to_thread(self._open)
+            await asyncio.to_thread(self._file.write, chunk)
+            self.size += len(chunk)
+        except OSError as e:
+            print(f"⚠️ Could not cache streamed TTS audio: {e}")
+            self._failed = True
+            await asyncio.to_thread(self._discard)
+
+    async def commit(self):
+        if self._failed or self._file is None:
+            return
+        try:
+            await asyncio.to_thread(self._close)
+            await asyncio.to_thread(os.replace, self._tmp_path, _path(self.key))
+        except OSError as e:
+            print(f"⚠️ Could not cache streamed TTS audio: {e}")
+            await asyncio.to_thread(self._discard)
+            return
+        _add(self.key, self.size)
+
+    async def abort(self):
+        if self._file is not None or self._tmp_path:
+            await asyncio.to_thread(self._discard)
+
+
+def stats() -> dict:
+    lookups = _stats["hits"] + _stats["misses"]
+    return {
+        **_stats,
+        "hit_rate": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        "entries": len(_index) if _index is not None else 0,
+        "bytes": _total_bytes,
+        "max_bytes": TTS_CACHE_MAX_BYTES,
+    }
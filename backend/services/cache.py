@@ -0,0 +1,199 @@
+"""Small in-process caches shared by the GreenMason services."""
+
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Iterator, Optional
+
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after a fixed TTL.
+
+    Expiry uses wall-clock time so entries can be dumped to disk and
+    loaded back by another process without resetting their age.
+
+    Pass `weigh` and `max_weight` to also bound the total size of the
+    values (e.g. characters held); weights are re-measured on every set().
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        max_weight: Optional[int] = None,
+        weigh: Optional[Callable[[Any], int]] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_weight = max_weight
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self._weigh = weigh
+        self._weights: dict[Hashable, int] = {}
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry and mark it recently used. Counts hits/misses."""
+        value = self.peek(key, _missing)
+        if value is _missing:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value
+
+    def peek(self, key: Hashable, default: Any = None) -> Any:
+        """Return a live entry without touching LRU order or counters."""
+        item = self._data.get(key)
+        if item is None:
+            return default
+        expires_at, value = item
+        if expires_at <= time.time():
+            self._remove(key)
+            return default
+        return value
+
+    def touch(self, key: Hashable) -> None:
+        """Mark an entry as recently used."""
+        if key in self._data:
+            self._data.move_to_end(key)
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._data[key] = (time.time() + ttl, value)
+        self._data.move_to_end(key)
+        if self._weigh:
+            new_weight = self._weigh(value)
+            self.weight += new_weight - self._weights.get(key, 0)
+            self._weights[key] = new_weight
+        self._evict()
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        if key not in self._data:
+            return default
+        return self._remove(key)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self._weights.clear()
+        self.weight = 0
+
+    def _remove(self, key: Hashable) -> Any:
+        _, value = self._data.pop(key)
+        self.weight -= self._weights.pop(key, 0)
+        return value
+
+    def _evict(self) -> None:
+        """Drop least recently used entries until within both bounds."""
+        while len(self._data) > self.max_entries or (
+            self.max_weight is not None and self.weight > self.max_weight and len(self._data) > 1
+        ):
+            self._remove(next(iter(self._data)))
+
+    def items(self) -> Iterator[tuple[Hashable, Any]]:
+        """Iterate live entries, least recently used first, without touching them."""
+        now = time.time()
+        for key, (expires_at, value) in list(self._data.items()):
+            if expires_at > now:
+                yield key, value
+
+    def dump(self) -> list[tuple[Hashable, float, Any]]:
+        """Snapshot live entries as (key, expires_at, value), LRU first."""
+        now = time.time()
+        return [(k, exp, v) for k, (exp, v) in self._data.items() if exp > now]
+
+    def load(self, entries: list[tuple[Hashable, float, Any]]) -> None:
+        """Restore entries produced by dump(), skipping any that expired."""
+        now = time.time()
+        for key, expires_at, value in entries:
+            if expires_at > now:
+                self.set(key, value, ttl_seconds=expires_at - now)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            **({"weight": self.weight, "max_weight": self.max_weight} if self._weigh else {}),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class ReadThroughCache:
+    """
+    Short-TTL cache in front of an async loader, with an ETag per value.
+
+    Concurrent misses for the same key share one load (single-flight).
+    invalidate() drops everything, and a load that was already running
+    when it was called is returned to its waiters but not cached.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 256):
+        self._cache = TTLCache(max_entries, ttl_seconds)
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._generation = 0
+        self.coalesced = 0
+        self.invalidations = 0
+
+    async def get(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> tuple[Any, str]:
+        """Return (value, etag), loading it at most once per key at a time."""
+        item = self._cache.get(key)
+        if item is not None:
+            return item
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, load))
+            self._inflight[key] = task
+        else:
+            self.coalesced += 1
+        # Shielded so one waiter disconnecting doesn't cancel the others' load
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> tuple[Any, str]:
+        generation = self._generation
+        try:
+            value = await load()
+            item = (value, etag_for(value))
+            if generation == self._generation:
+                self._cache.set(key, item)
+            return item
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def invalidate(self) -> None:
+        self._cache.clear()
+        self._inflight.clear()
+        self._generation += 1
+        self.invalidations += 1
+
+    def stats(self) -> dict:
+        base = self._cache.stats()
+        return {
+            "entries": base["entries"],
+            "ttl_seconds": base["ttl_seconds"],
+            "hits": base["hits"],
+            "misses": base["misses"] - self.coalesced,
+            "coalesced": self.coalesced,
+            "invalidations": self.invalidations,
+            "hit_rate": base["hit_rate"],
+        }
+
+
+def etag_for(value: Any) -> str:
+    """Strong ETag for a JSON-serializable value."""
+    body = json.dumps(value, sort_keys=True, default=str, separators=(",", ":"))
+    return f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()[:20]}"'
+
+
+_missing = object()
@@ -0,0 +1,152 @@
+"""Response cache for frequently asked EcoChat questions.
+
+Most first messages are the same handful of questions ("where do I recycle
+batteries?", "is a pizza box compostable?"). Only first-turn questions are
+cached — with history the right answer depends on the conversation.
+
+Lookup is two-step:
+1. Exact match on a normalized key (lowercased, punctuation and stopwords
+   removed), so "Where can I recycle batteries?" == "how do i recycle batteries"
+2. Optional TF-IDF cosine similarity (unigrams + bigrams) against cached
+   questions, above CHAT_CACHE_SIMILARITY. An inverted index (term -> cached
+   keys) limits scoring to questions sharing a term with the query, and its
+   posting sizes are the document frequencies, so a miss never walks the
+   whole cache
+
+The full ChatResponse fields are stored, routing included, so a hit is
+indistinguishable from a fresh answer.
+"""
+
+import os
+import re
+import math
+from collections import Counter
+from typing import Optional
+
+from services.cache import TTLCache
+
+CHAT_CACHE_MAX_ENTRIES = int(os.getenv("CHAT_CACHE_MAX_ENTRIES", "1000"))
+CHAT_CACHE_TTL_SECONDS = float(os.getenv("CHAT_CACHE_TTL_SECONDS", str(6 * 3600)))
+CHAT_CACHE_SIMILARITY = float(os.getenv("CHAT_CACHE_SIMILARITY", "0.8"))  # > 1 disables
+
+STOPWORDS = frozenset("""
+a an the and or but if of to in on at by for with about from into onto up down out over
+is are was were be been being am do does did doing have has had can could should would will
+shall may might must i me my mine we us our you your he she it its they them their this that
+these those there here what which who whom whose when where why how please tell know
+any some just so also very really thing things get got
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+# normalized key -> {"terms": Counter, "response": dict}
+_entries = TTLCache(CHAT_CACHE_MAX_ENTRIES, CHAT_CACHE_TTL_SECONDS)
+_similar_hits = 0
+# Inverted index over cached questions: term -> keys, and key -> its terms
+_postings: dict[str, set[str]] = {}
+_key_terms: dict[str, Counter] = {}
+
+
+def _tokens(message: str) -> list[str]:
+    words = [w.replace("'", "") for w in _WORD.findall(message.lower())]
+    content = [w for w in words if w not in STOPWORDS]
+    return content or words
+
+
+def normalize(message: str) -> str:
+    """Cache key: lowercased content words, punctuation and stopwords removed."""
+    return " ".join(_tokens(message))
+
+
+def _terms(tokens: list[str]) -> Counter:
+    return Counter(tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])])
+
+
+def _index(key: str, terms: Counter):
+    _forget(key)
+    _key_terms[key] = terms
+    for term in terms:
+        _postings.setdefault(term, set()).add(key)
+
+
+def _forget(key: str):
+    for term in _key_terms.pop(key, ()):
+        keys = _postings[term]
+        keys.discard(key)
+        if not keys:
+            del _postings[term]
+
+
+def _tfidf(terms: Counter, docs: int) -> dict:
+    vector = {
+        term: (1 + math.log(count)) * (math.log((1 + docs) / (1 + len(_postings.get(term, ())))) + 1)
+        for term, count in terms.items()
+    }
+    norm = math.sqrt(sum(w * w for w in vector.values())) or 1.0
+    return {term: w / norm for term, w in vector.items()}
+
+
+def get(message: str) -> Optional[dict]:
+    """Cached ChatResponse fields for a first-turn question, or None."""
+    global _similar_hits
+    key = normalize(message)
+    entry = _entries.get(key)
+    if entry:
+        return dict(entry["response"])
+    if CHAT_CACHE_SIMILARITY > 1 or not key:
+        return None
+
+    terms = _terms(key.split())
+    candidates = {}
+    for cached_key in set().union(*(_postings.get(term, ()) for term in terms)):
+        cached = _entries.peek(cached_key)
+        if cached is None:
+            _forget(cached_key)  # expired or evicted
+        else:
+            candidates[cached_key] = cached
+    if not candidates:
+        return None
+
+    docs = len(_key_terms)
+    query = _tfidf(terms, docs)
+    best_key, best_entry, best_score = None, None, CHAT_CACHE_SIMILARITY
+    for cached_key, cached in candidates.items():
+        candidate = _tfidf(cached["terms"], docs)
+        score = sum(w * candidate.get(term, 0.0) for term, w in query.items())
+        if score >= best_score:
+            best_key, best_entry, best_score = cached_key, cached, score
+
+    if best_entry is None:
+        return None
+    _entries.touch(best_key)
+    _similar_hits += 1
+    return dict(best_entry["response"])
+
+
+def put(message: str, response: dict):
+    """Store the final (routing-merged) ChatResponse fields for a question."""
+    key = normalize(message)
+    if not key:
+        return
+    terms = _terms(key.split())
+    _entries.set(key, {"terms": terms, "response": dict(response)})
+    _index(key, terms)
+    if len(_key_terms) > len(_entries):
+        # The set evicted something; drop it from the index
+        for stale in [k for k in _key_terms if _entries.peek(k) is None]:
+            _forget(stale)
+
+
+def stats() -> dict:
+    """Hit-rate stats. A similarity hit first counts as an exact miss."""
+    base = _entries.stats()
+    lookups = base["hits"] + base["misses"]
+    hits = base["hits"] + _similar_hits
+    return {
+        "entries": base["entries"],
+        "max_entries": base["max_entries"],
+        "exact_hits": base["hits"],
+        "similar_hits": _similar_hits,
+        "misses": base["misses"] - _similar_hits,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+    }
@@ -0,0 +1,121 @@
+"""Server-side EcoChat sessions.
+
+Instead of resending the whole conversation on every /api/chat call,
+clients send a session_id and just the new message. Each session keeps its
+turns as plain dicts (for persistence) alongside the Gemini Content objects
+built from them, so a turn is converted once rather than on every request.
+
+Sessions live in an in-memory LRU with a sliding TTL, bounded per session
+(turns and characters) and overall (sessions and characters). Set
+CHAT_SESSION_PERSIST=1 to also keep them in MongoDB so they survive
+restarts and work across workers.
+"""
+
+import os
+import uuid
+from typing import Optional
+
+from services import gemini, mongodb
+from services.cache import TTLCache
+
+CHAT_SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", "7200"))
+CHAT_SESSION_MAX_SESSIONS = int(os.getenv("CHAT_SESSION_MAX_SESSIONS", "5000"))
+CHAT_SESSION_MAX_TURNS = int(os.getenv("CHAT_SESSION_MAX_TURNS", "60"))
+CHAT_SESSION_MAX_CHARS = int(os.getenv("CHAT_SESSION_MAX_CHARS", "40000"))
+CHAT_SESSION_MAX_TOTAL_CHARS = int(os.getenv("CHAT_SESSION_MAX_TOTAL_CHARS", "50000000"))
+CHAT_SESSION_PERSIST = os.getenv("CHAT_SESSION_PERSIST", "") == "1"
+
+
+class SessionExpiredError(Exception):
+    """The client's session is gone (restart, eviction, another worker) and it sent no history."""
+
+
+class ChatSession:
+    """
+    One conversation's turns, their pre-built Gemini contents, and the
+    rolling summary of older turns (see gemini.compact_history).
+    """
+
+    __slots__ = (
+        "session_id", "turns", "contents", "chars",
+        "turn_offset", "summary", "summary_end", "summarizing",
+    )
+
+    def __init__(self, session_id: str, turns: list[dict] = None):
+        self.session_id = session_id
+        self.turns: list[dict] = []
+        self.contents: list = []
+        self.chars = 0
+        self.turn_offset = 0  # turns dropped from the front so far
+        self.summary: Optional[str] = None
+        self.summary_end = 0  # absolute index just past the last summarized turn
+        self.summarizing = False
+        self.extend(turns or [])
+
+    def extend(self, turns: list[dict]):
+        for turn in turns:
+            turn = {"role": turn["role"], "content": turn["content"]}
+            self.turns.append(turn)
+            self.contents.append(gemini.to_content(turn))
+            self.chars += len(turn["content"])
+
+        # Per-session limits: drop the oldest turns first
+        while self.turns and (
+            len(self.turns) > CHAT_SESSION_MAX_TURNS or self.chars > CHAT_SESSION_MAX_CHARS
+        ):
+            dropped = self.turns.pop(0)
+            self.contents.pop(0)
+            self.chars -= len(dropped["content"])
+            self.turn_offset += 1
+
+
+_sessions = TTLCache(
+    CHAT_SESSION_MAX_SESSIONS,
+    CHAT_SESSION_TTL_SECONDS,
+    max_weight=CHAT_SESSION_MAX_TOTAL_CHARS,
+    weigh=lambda session: session.chars,
+)
+
+
+async def get_or_create(session_id: Optional[str], history: list[dict] = None) -> ChatSession:
+    """
+    Resume a session, or start a new one (seeded from `history` when a
+    client still sends it). Unknown or expired ids get a fresh session
+    with a new id rather than trusting the client's; if the client sent
+    no history with one, SessionExpiredError asks it to resend it instead
+    of silently dropping the conversation.
+    """
+    if session_id:
+        session = _sessions.get(session_id)
+        if session:
+            return session
+        if CHAT_SESSION_PERSIST:
+            turns = await mongodb.load_chat_session(session_id)
+            if turns is not None:
+                session = ChatSession(session_id, turns)
+                _sessions.set(session_id, session)
+                return session
+        if not history:
+            raise SessionExpiredError(session_id)
+
+    session = ChatSession(uuid.uuid4().hex, history)
+    _sessions.set(session.session_id, session)
+    if CHAT_SESSION_PERSIST and session.turns:
+        await mongodb.append_chat_turns(session.session_id, session.turns, CHAT_SESSION_MAX_TURNS)
+    return session
+
+
+async def append_exchange(session: ChatSession, message: str, reply: str):
+    """Record one user message and the assistant's reply."""
+    turns = [
+        {"role": "user", "content": message},
+        {"role": "assistant", "content": reply},
+    ]
+    session.extend(turns)
+    _sessions.set(session.session_id, session)  # re-weigh and refresh the TTL
+    if CHAT_SESSION_PERSIST:
+        await mongodb.append_chat_turns(session.session_id, turns, CHAT_SESSION_MAX_TURNS)
+
+
+def stats() -> dict:
+    return {**_sessions.stats(), "persistent": CHAT_SESSION_PERSIST}
@@ -0,0 +1,123 @@
+"""Content-addressed cache for Snap & Sort classification results.
+
+Students photograph the same items over and over, so before paying for a
+Gemini Vision call we look the image up twice:
+1. By exact SHA-256 of the image bytes (same photo re-submitted)
+2. By perceptual hash (dHash) within a small Hamming distance
+   (same item, different photo)
+
+Entries are evicted LRU-first and expire after a TTL. Set
+CLASSIFY_CACHE_PATH to persist the cache to disk across restarts.
+"""
+
+import os
+import json
+import hashlib
+from typing import Optional
+
+from services.cache import TTLCache
+from services.imaging import hamming_distance
+
+CLASSIFY_CACHE_MAX_ENTRIES = int(os.getenv("CLASSIFY_CACHE_MAX_ENTRIES", "2048"))
+CLASSIFY_CACHE_TTL_SECONDS = float(os.getenv("CLASSIFY_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+CLASSIFY_CACHE_PHASH_DISTANCE = int(os.getenv("CLASSIFY_CACHE_PHASH_DISTANCE", "6"))
+CLASSIFY_CACHE_PATH = os.getenv("CLASSIFY_CACHE_PATH", "")
+
+# Flat or low-texture photos hash to (nearly) all zeros or all ones, which
+# would "match" any other such photo; only hashes with enough set bits are
+# used for near-duplicate lookups
+PHASH_MIN_BITS = 8
+PHASH_MAX_BITS = 56
+
+# sha256 hex -> {"phash": int | None, "result": dict}
+_entries = TTLCache(CLASSIFY_CACHE_MAX_ENTRIES, CLASSIFY_CACHE_TTL_SECONDS)
+_near_hits = 0
+
+
+def image_key(image_bytes) -> str:
+    """Exact content key for an image (accepts bytes or any buffer)."""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+
+def get(key: str) -> Optional[dict]:
+    """Look up a result by exact image hash."""
+    entry = _entries.get(key)
+    return dict(entry["result"]) if entry else None
+
+
+def _distinctive(phash: Optional[int]) -> bool:
+    return phash is not None and PHASH_MIN_BITS <= phash.bit_count() <= PHASH_MAX_BITS
+
+
+def find_similar(phash: Optional[int]) -> Optional[dict]:
+    """Look up the closest result whose perceptual hash is within range."""
+    global _near_hits
+    if not _distinctive(phash) or CLASSIFY_CACHE_PHASH_DISTANCE < 0:
+        return None
+
+    best_key, best_entry, best_distance = None, None, CLASSIFY_CACHE_PHASH_DISTANCE + 1
+    for key, entry in _entries.items():
+        if not _distinctive(entry["phash"]):
+            continue
+        distance = hamming_distance(entry["phash"], phash)
+        if distance < best_distance:
+            best_key, best_entry, best_distance = key, entry, distance
+            if distance == 0:
+                break
+
+    if best_entry is None:
+        return None
+    _entries.touch(best_key)
+    _near_hits += 1
+    return dict(best_entry["result"])
+
+
+def put(key: str, phash: Optional[int], result: dict) -> None:
+    """Store a classification result (including points_earned)."""
+    _entries.set(key, {"phash": phash, "result": dict(result)})
+
+
+# ── Persistence ─────────────────────────────────────────────────
+
+def load():
+    """Load the on-disk snapshot, if persistence is enabled."""
+    if not CLASSIFY_CACHE_PATH or not os.path.exists(CLASSIFY_CACHE_PATH):
+        return
+    try:
+        with open(CLASSIFY_CACHE_PATH, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        _entries.load([tuple(entry) for entry in snapshot.get("entries", [])])
+        print(f"🗂️ Loaded {len(_entries)} cached classifications")
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Could not load classification cache: {e}")
+
+
+def save():
+    """Write the cache to disk atomically, if persistence is enabled."""
+    if not CLASSIFY_CACHE_PATH:
+        return
+    tmp_path = CLASSIFY_CACHE_PATH + ".tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": _entries.dump()}, f)
+        os.replace(tmp_path, CLASSIFY_CACHE_PATH)
+    except OSError as e:
+        print(f"⚠️ Could not save classification cache: {e}")
+
+
+# ── Stats ───────────────────────────────────────────────────────
+
+def stats() -> dict:
+    """Hit/miss counters. A near-duplicate hit first counts as an exact miss."""
+    base = _entries.stats()
+    lookups = base["hits"] + base["misses"]
+    hits = base["hits"] + _near_hits
+    return {
+        "entries": base["entries"],
+        "max_entries": base["max_entries"],
+        "exact_hits": base["hits"],
+        "near_duplicate_hits": _near_hits,
+        "misses": base["misses"] - _near_hits,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "persistent": bool(CLASSIFY_CACHE_PATH),
+    }
@@ -0,0 +1,115 @@
+"""Precomputed daily sustainability tip (text + MP3).
+
+The tip is supposed to be *daily*, so instead of calling Gemini and
+ElevenLabs on every home-screen load, a background task started from
+main.py's lifespan generates the day's tip and its audio once, stores both
+in MongoDB, and serves them from memory. If today's generation fails, the
+previous tip keeps being served and generation is retried.
+"""
+
+import asyncio
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from services import gemini, elevenlabs, mongodb
+
+TIP_RETRY_SECONDS = 600
+
+_current: Optional[dict] = None
+_lock = asyncio.Lock()
+_task: Optional[asyncio.Task] = None
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def seconds_until_rollover() -> int:
+    """Seconds until the next UTC midnight, when a new tip is generated."""
+    now = datetime.now(timezone.utc)
+    tomorrow = (now + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return max(1, int((tomorrow - now).total_seconds()))
+
+
+def _set_current(doc: dict):
+    global _current
+    digest = hashlib.sha256(doc["text"].encode("utf-8") + doc["audio"]).hexdigest()[:16]
+    _current = {
+        "date": doc["_id"],
+        "text": doc["text"],
+        "audio": doc["audio"],
+        "etag": f'"tip-{doc["_id"]}-{digest}"',
+    }
+
+
+async def refresh():
+    """Make sure today's tip is loaded, generating it if nobody has yet."""
+    async with _lock:
+        today = _today()
+        if _current and _current["date"] == today:
+            return
+
+        latest = await mongodb.get_latest_daily_tip()
+        if latest and latest["_id"] == today:
+            _set_current(latest)
+            return
+
+        text = await gemini.generate_daily_tip()
+        audio = await elevenlabs.text_to_speech(text)
+        _set_current(await mongodb.save_daily_tip(today, text, audio))
+        print(f"💡 Daily tip ready for {today}")
+
+
+async def _run():
+    while True:
+        try:
+            await refresh()
+            delay = seconds_until_rollover() + 5
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Daily tip generation failed, serving previous tip: {e}")
+            delay = min(TIP_RETRY_SECONDS, seconds_until_rollover() + 5)
+        await asyncio.sleep(delay)
+
+
+async def start():
+    """
+    Load the latest stored tip so there is something to serve right away,
+    then start the scheduler (called from the lifespan hook).
+    """
+    global _task
+    latest = await mongodb.get_latest_daily_tip()
+    if latest and not _current:
+        _set_current(latest)
+    if _task is None:
+        _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def cache_max_age() -> int:
+    """How long clients may cache the tip: until rollover, or briefly for a stale fallback."""
+    if _current and _current["date"] != _today():
+        return 300
+    return seconds_until_rollover()
+
+
+async def get_tip() -> dict:
+    """
+    The current tip: {"date", "text", "audio", "etag"}. Only generates on
+    the request path if no tip has ever been stored.
+    """
+    if _current is None:
+        await refresh()
+    return _current
@@ -0,0 +1,53 @@
+"""Everything the dashboard page shows, in one call.
+
+The profile and recent actions come from a single users aggregation
+(with a $lookup into actions); the rank is answered by the in-memory rank
+index, and the leaderboard and global stats by the shared read caches, so
+a dashboard view costs one MongoDB round trip when the caches are warm.
+The three reads run concurrently.
+"""
+
+import asyncio
+from typing import Optional
+
+from services import mongodb, rank_index, read_cache
+
+# The dashboard page's achievements
+BADGES = [
+    ("actions_count", 1, "🌱", "First Date with Recycling"),
+    ("actions_count", 5, "💕", "Compost Cupid"),
+    ("actions_count", 10, "♻️", "Recycling Romantic"),
+    ("total_score", 50, "🌿", "Green Heart"),
+    ("total_score", 100, "💚", "Earth Lover"),
+    ("total_score", 200, "🌍", "Planet Protector"),
+    ("total_score", 500, "💎", "Sustainability Soulmate"),
+]
+
+
+def earned_badges(user: dict) -> list[dict]:
+    return [
+        {"emoji": emoji, "name": name}
+        for field, threshold, emoji, name in BADGES
+        if user.get(field, 0) >= threshold
+    ]
+
+
+async def get_dashboard(username: str, leaderboard_limit: int = 20, actions_limit: int = 10) -> Optional[dict]:
+    """The dashboard payload for `username`, or None if there's no such user."""
+    user, (leaderboard, _), (stats, _) = await asyncio.gather(
+        mongodb.get_user_with_actions(username, actions_limit),
+        read_cache.get_leaderboard(leaderboard_limit),
+        read_cache.get_global_stats(),
+    )
+    if user is None:
+        return None
+
+    recent_actions = user.pop("recent_actions")
+    user["rank"] = await rank_index.get_user_rank(username, user["total_score"])
+    return {
+        "user": user,
+        "badges": earned_badges(user),
+        "recent_actions": recent_actions,
+        "leaderboard": leaderboard,
+        "stats": stats,
+    }
@@ -1,7 +1,39 @@
-"""ElevenLabs Text-to-Speech service for GreenMason voice features."""
+"""ElevenLabs Text-to-Speech service for GreenMason voice features.
+
+Long text is split on sentence boundaries into chunks of at most
+TTS_CHUNK_CHARS, synthesized concurrently (at most TTS_MAX_CONCURRENCY
+upstream calls at a time) and joined back into one MP3. Each chunk is
+cached on its own, and concurrent requests for the same chunk (within one
+text or across requests) share a single in-flight synthesis, so repeated
+sentences are only synthesized once.
+"""
 
 import os
-import httpx
+import re
+import json
+import asyncio
+import hashlib
+import textwrap
+from contextlib import aclosing
+from typing import AsyncIterator
+
+from services import audio_cache, http_client
+
+MODEL_ID = "eleven_multilingual_v2"
+VOICE_SETTINGS = {
+    "stability": 0.5,
+    "similarity_boost": 0.75,
+    "style": 0.3,
+    "use_speaker_boost": True
+}
+TTS_STREAM_CHUNK_BYTES = int(os.getenv("TTS_STREAM_CHUNK_BYTES", str(16 * 1024)))
+TTS_CHUNK_CHARS = int(os.getenv("TTS_CHUNK_CHARS", "500"))
+TTS_MAX_CONCURRENCY = int(os.getenv("TTS_MAX_CONCURRENCY", "4"))
+
+_tts_slots = asyncio.Semaphore(TTS_MAX_CONCURRENCY)
+# speech_key -> the synthesis currently producing that chunk's audio
+_inflight: dict[str, asyncio.Task] = {}
+_SENTENCE_END = re.compile(r"(?<=[.!?…])\s+")
 
 
 def _get_api_key():
@@ -12,48 +44,223 @@ def _get_voice_id():
     return os.getenv("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")
 
 
-async def text_to_speech(text: str) -> bytes:
+def speech_key(text: str) -> str:
     """
-    Convert text to speech using ElevenLabs API.
+    Content address for the audio of `text`: a hash of everything that
+    changes the MP3 (text, voice, model, voice settings). Doubles as the ETag.
     """
-    if len(text) > 500:
-        text = text[:497] + "..."
+    material = json.dumps(
+        [text, _get_voice_id(), MODEL_ID, VOICE_SETTINGS],
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
 
-    api_key = _get_api_key()
+def _request(text: str, stream: bool = False) -> tuple[str, dict, dict]:
+    """URL, headers and payload for a synthesis call."""
     voice_id = _get_voice_id()
     url = f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}"
+    if stream:
+        url += "/stream"
 
     headers = {
         "Accept": "audio/mpeg",
         "Content-Type": "application/json",
-        "xi-api-key": api_key,
+        "xi-api-key": _get_api_key(),
     }
 
     payload = {
         "text": text,
-        "model_id": "eleven_multilingual_v2",
-        "voice_settings": {
-            "stability": 0.5,
-            "similarity_boost": 0.75,
-            "style": 0.3,
-            "use_speaker_boost": True
-        }
+        "model_id": MODEL_ID,
+        "voice_settings": VOICE_SETTINGS,
     }
+    return url, headers, payload
+
+
+def split_text(text: str) -> list[str]:
+    """
+    Split text into chunks of at most TTS_CHUNK_CHARS, breaking between
+    sentences where possible. Text that already fits is returned as-is.
+    """
+    if len(text) <= TTS_CHUNK_CHARS:
+        return [text]
+
+    chunks, current = [], ""
+    for sentence in _SENTENCE_END.split(text.strip()):
+        pieces = [sentence] if len(sentence) <= TTS_CHUNK_CHARS else textwrap.wrap(sentence, TTS_CHUNK_CHARS)
+        for piece in pieces:
+            if current and len(current) + 1 + len(piece) > TTS_CHUNK_CHARS:
+                chunks.append(current)
+                current = piece
+            else:
+                current = f"{current} {piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _strip_id3(audio: bytes) -> bytes:
+    """Drop a leading ID3v2 tag so MP3s can be joined mid-stream."""
+    if len(audio) < 10 or audio[:3] != b"ID3":
+        return audio
+    size = (audio[6] << 21) | (audio[7] << 14) | (audio[8] << 7) | audio[9]
+    if audio[5] & 0x10:  # footer present
+        size += 10
+    return audio[10 + size:]
+
+
+def join_mp3(parts: list[bytes]) -> bytes:
+    """Concatenate MP3 clips, keeping only the first clip's ID3 tag."""
+    return b"".join(part if i == 0 else _strip_id3(part) for i, part in enumerate(parts))
+
+
+async def _synthesize(text: str) -> bytes:
+    """Audio for one chunk of text, from the cache or ElevenLabs (single-flight per chunk)."""
+    key = speech_key(text)
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_load(key, text))
+        _inflight[key] = task
+    # Shielded so one waiter going away doesn't cancel the others' synthesis
+    return await asyncio.shield(task)
+
+
+async def _load(key: str, text: str) -> bytes:
+    try:
+        cached = await audio_cache.get(key)
+        if cached is not None:
+            return cached
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(url, json=payload, headers=headers)
+        url, headers, payload = _request(text)
+        async with _tts_slots:
+            response = await http_client.get_client().post(url, json=payload, headers=headers)
         response.raise_for_status()
-        return response.content
+        audio = response.content
 
+        await audio_cache.put(key, audio)
+        return audio
+    finally:
+        if _inflight.get(key) is asyncio.current_task():
+            del _inflight[key]
 
-async def generate_score_summary_audio(username: str, score: int, rank: int) -> bytes:
+
+async def _synthesize_stream(text: str) -> AsyncIterator[bytes]:
     """
-    Generate an audio summary of a user's Green Score.
+    Like _synthesize, but yields MP3 chunks as ElevenLabs' streaming
+    endpoint produces them. The upstream response is read by a background
+    task (see _load_stream), so the TTS slot is freed as soon as ElevenLabs
+    is done, however slowly the client reads; this generator just relays
+    what has arrived so far.
     """
-    text = (
-        f"Hey {username}! Your Green Score is {score} points, "
-        f"and you're ranked number {rank} on the campus leaderboard. "
-        f"Keep making sustainable choices — every action counts! "
-        f"Happy Green Day."
-    )
-    return await text_to_speech(text)
\ No newline at end of file
+    key = speech_key(text)
+    task = _inflight.get(key)
+    if task is None:
+        cached = await audio_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+        task = _inflight.get(key)
+    if task is not None:
+        # Another request is already synthesizing this chunk; share its result
+        yield await asyncio.shield(task)
+        return
+
+    chunks: asyncio.Queue = asyncio.Queue()
+    task = asyncio.ensure_future(_load_stream(key, text, chunks))
+    _inflight[key] = task
+    # If the client leaves, nobody awaits a failure; mark it retrieved
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    while (chunk := await chunks.get()) is not None:
+        yield chunk
+    await asyncio.shield(task)  # raises if the upstream stream failed
+
+
+async def _load_stream(key: str, text: str, chunks: asyncio.Queue) -> bytes:
+    """
+    Read one streaming synthesis to the end, handing each chunk to
+    `chunks` (None marks the end), then cache the whole clip. It runs to
+    completion even if the client goes away, so audio that was paid for
+    still gets cached; a failed stream caches nothing. Buffering is bounded
+    by one chunk's audio (TTS_CHUNK_CHARS of text).
+    """
+    try:
+        url, headers, payload = _request(text, stream=True)
+        parts = []
+        async with _tts_slots:
+            async with http_client.get_client().stream("POST", url, json=payload, headers=headers) as response:
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(TTS_STREAM_CHUNK_BYTES):
+                    parts.append(chunk)
+                    chunks.put_nowait(chunk)
+        audio = b"".join(parts)
+        await audio_cache.put(key, audio)
+        return audio
+    finally:
+        chunks.put_nowait(None)
+        if _inflight.get(key) is asyncio.current_task():
+            del _inflight[key]
+
+
+async def text_to_speech(text: str) -> bytes:
+    """
+    Convert text to speech using ElevenLabs API.
+    Identical requests are served from the on-disk audio cache.
+    """
+    chunks = split_text(text)
+    if len(chunks) == 1:
+        return await _synthesize(chunks[0])
+
+    key = speech_key(text)
+    cached = await audio_cache.get(key)
+    if cached is not None:
+        return cached
+
+    audio = join_mp3(await asyncio.gather(*(_synthesize(chunk) for chunk in chunks)))
+    await audio_cache.put(key, audio)
+    return audio
+
+
+async def text_to_speech_stream(text: str) -> AsyncIterator[bytes]:
+    """
+    Streaming text_to_speech: yields MP3 bytes as soon as they exist.
+    For long text the first chunk is relayed from the streaming endpoint
+    while the remaining chunks are synthesized concurrently and yielded
+    in order once their turn comes.
+    """
+    chunks = split_text(text)
+    if len(chunks) == 1:
+        async with aclosing(_synthesize_stream(chunks[0])) as stream:
+            async for data in stream:
+                yield data
+        return
+
+    key = speech_key(text)
+    cached = await audio_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    # Queue the rest before the first stream starts, so the first chunk
+    # takes its upstream slot ahead of them
+    rest = [asyncio.create_task(_synthesize(chunk)) for chunk in chunks[1:]]
+    writer = audio_cache.StreamWriter(key)
+    completed = False
+    try:
+        async with aclosing(_synthesize_stream(chunks[0])) as stream:
+            async for data in stream:
+                await writer.write(data)
+                yield data
+        for task in rest:
+            data = _strip_id3(await task)
+            await writer.write(data)
+            yield data
+        completed = True
+    finally:
+        for task in rest:
+            task.cancel()
+        if completed:
+            await writer.commit()
+        else:
+            await writer.abort()
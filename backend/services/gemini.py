@@ -10,10 +10,14 @@ service account JSON content (base64 encoded).
 import os
 import json
 import base64
+import asyncio
 import tempfile
+from collections import deque
 import vertexai
 from vertexai.generative_models import GenerativeModel, Part, GenerationConfig, Content
 
+from services import classification_cache, imaging
+
 # Initialize Vertex AI
 PROJECT_ID = os.getenv("GCP_PROJECT_ID")
 LOCATION = os.getenv("GCP_LOCATION", "us-east4")
@@ -40,6 +44,72 @@ def _ensure_init():
 MODEL_NAME = "gemini-2.0-flash-001"
 
 
+# ── Execution Engine ────────────────────────────────────────────
+# Every Gemini call goes through _call(): the async Vertex API keeps the
+# event loop free while a request is in flight, the semaphore caps how many
+# upstream calls one worker runs at once, and each call gets its own
+# timeout, which also covers waiting for a slot. Streams have their own
+# semaphore, since a stream is paced by the client reading it and would
+# otherwise keep a slot from every classify and chat call meanwhile.
+
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+GEMINI_MAX_STREAMS = int(os.getenv("GEMINI_MAX_STREAMS", "8"))
+GEMINI_TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "30"))
+
+_gemini_slots = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+_stream_slots = asyncio.Semaphore(GEMINI_MAX_STREAMS)
+
+
+class GeminiBusyError(Exception):
+    """No Gemini slot freed up before the call's deadline."""
+
+
+async def _acquire(slots: asyncio.Semaphore, timeout: float):
+    try:
+        await asyncio.wait_for(slots.acquire(), timeout=timeout)
+    except asyncio.TimeoutError:
+        raise GeminiBusyError("Gemini is busy, try again shortly") from None
+
+
+async def _call(make_call, timeout: float = GEMINI_TIMEOUT_SECONDS):
+    """Await one Gemini coroutine under the concurrency cap and a timeout.
+
+    `make_call` is a zero-argument callable returning the coroutine, so the
+    request is only issued once a slot is free. Raises GeminiBusyError if
+    no slot frees up within the timeout.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    await _acquire(_gemini_slots, timeout)
+    try:
+        return await asyncio.wait_for(make_call(), timeout=max(0.0, deadline - loop.time()))
+    finally:
+        _gemini_slots.release()
+
+
+async def _stream(make_call, timeout: float = GEMINI_TIMEOUT_SECONDS):
+    """Streaming counterpart of _call(): yields response chunks.
+
+    A stream slot is held until the stream ends. The timeout applies to
+    getting a slot plus the initial call, and to the gap between
+    consecutive chunks.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    await _acquire(_stream_slots, timeout)
+    try:
+        responses = await asyncio.wait_for(make_call(), timeout=max(0.0, deadline - loop.time()))
+        chunks = responses.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout=timeout)
+            except StopAsyncIteration:
+                return
+            yield chunk
+    finally:
+        _stream_slots.release()
+
+
 # ── System Prompts ──────────────────────────────────────────────
 
 CLASSIFICATION_PROMPT = """You are GreenMason's waste classification AI for George Mason University campus.
@@ -89,7 +159,11 @@ GMU Sustainability Context:
 - GMU is working toward carbon neutrality
 - PatriotAI (patriotai.gmu.edu) has additional campus-specific agents
 
-IMPORTANT ROUTING RULES — Check EVERY user message for these:
+Keep responses concise (2-4 sentences for simple questions, up to a paragraph for complex ones).
+"""
+
+# Left out of the prompt when the local intent model has already routed the message
+CHAT_ROUTING_RULES = """IMPORTANT ROUTING RULES — Check EVERY user message for these:
 If the user asks about ANY of these topics, you MUST include the routing tag at the END of your response:
 
 1. Campus administrative questions (class registration, financial aid, housing, parking, campus policies, academic deadlines, student services)
@@ -105,8 +179,6 @@ If the user asks about ANY of these topics, you MUST include the routing tag at
    → Add: [ROUTE:DocuMate]
 
 Always give a helpful initial answer first, THEN add the routing tag if applicable. The tag should be on its own line at the very end.
-
-Keep responses concise (2-4 sentences for simple questions, up to a paragraph for complex ones).
 """
 
 PATRIOTAI_AGENTS = {
@@ -143,101 +215,436 @@ PATRIOTAI_AGENTS = {
 }
 
 
-async def classify_waste(image_base64: str, mime_type: str = "image/jpeg") -> dict:
+POINTS_MAP = {
+    "recyclable": 15, "compostable": 15, "reusable": 20,
+    "e-waste": 10, "hazardous": 10, "landfill": 5
+}
+
+FALLBACK_CLASSIFICATION = {
+    "category": "landfill",
+    "confidence": "low",
+    "item_name": "unidentified item",
+    "disposal_instructions": "When in doubt, place in the general waste bin.",
+    "gmu_tip": "Check the recycling guide at sustainability.gmu.edu for detailed sorting info.",
+    "fun_fact": "The average American produces about 4.4 pounds of waste per day!"
+}
+
+
+def _batch_prompt(count: int) -> str:
+    """CLASSIFICATION_PROMPT, adapted to several images in one request."""
+    return CLASSIFICATION_PROMPT + f"""
+BATCH MODE: You are given {count} images, in order. Classify each image separately.
+Respond with a STRICT JSON array (no markdown, no code fences) of exactly {count} objects,
+each in the format above, in the same order as the images.
+"""
+
+
+def _parse_json_reply(text: str):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1]
+    if text.endswith("```"):
+        text = text.rsplit("```", 1)[0]
+    return json.loads(text.strip())
+
+
+def _finish_classification(result: dict, cache_key: str, phash, cacheable: bool = True) -> dict:
+    result["points_earned"] = POINTS_MAP.get(result.get("category", "landfill"), 5)
+    if cacheable:
+        classification_cache.put(cache_key, phash, result)
+    return result
+
+
+async def _prepare_classification(image_bytes: bytes | memoryview, mime_type: str):
+    """
+    Shared front half of single and packed classification: both cache
+    lookups plus normalization. Returns (cached_result, cache_key, prepared);
+    `prepared` is None on an exact hit.
+    """
+    # Same photo again? Skip Gemini entirely.
+    cache_key = classification_cache.image_key(image_bytes)
+    cached = classification_cache.get(cache_key)
+    if cached:
+        return cached, cache_key, None
+
+    # Downscale + strip EXIF in the process pool; also yields the perceptual hash
+    prepared = await imaging.normalize(image_bytes, mime_type)
+
+    # Same item, different photo? Match on perceptual hash.
+    cached = classification_cache.find_similar(prepared["phash"])
+    return cached, cache_key, prepared
+
+
+async def classify_waste(image_bytes: bytes | memoryview, mime_type: str = "image/jpeg") -> dict:
+    """
+    Classify a waste photo. Takes the raw image bytes (or a memoryview
+    over them) so callers never need a base64 round-trip; the image is
+    normalized by services.imaging before it is sent to Vertex.
+    """
+    cached, cache_key, prepared = await _prepare_classification(image_bytes, mime_type)
+    if cached:
+        return cached
+
     _ensure_init()
     model = GenerativeModel(MODEL_NAME)
+    image_part = Part.from_data(prepared["data"], mime_type=prepared["mime_type"])
 
-    image_bytes = base64.b64decode(image_base64)
-    image_part = Part.from_data(image_bytes, mime_type=mime_type)
-
-    response = model.generate_content(
+    response = await _call(lambda: model.generate_content_async(
         [CLASSIFICATION_PROMPT, image_part],
         generation_config=GenerationConfig(
             temperature=0.3,
             max_output_tokens=500,
         )
-    )
-
-    text = response.text.strip()
-    if text.startswith("```"):
-        text = text.split("\n", 1)[1]
-    if text.endswith("```"):
-        text = text.rsplit("```", 1)[0]
-    text = text.strip()
+    ))
 
     try:
-        result = json.loads(text)
+        result = _parse_json_reply(response.text)
+        cacheable = True
     except json.JSONDecodeError:
-        result = {
-            "category": "landfill",
-            "confidence": "low",
-            "item_name": "unidentified item",
-            "disposal_instructions": "When in doubt, place in the general waste bin.",
-            "gmu_tip": "Check the recycling guide at sustainability.gmu.edu for detailed sorting info.",
-            "fun_fact": "The average American produces about 4.4 pounds of waste per day!"
-        }
-
-    points_map = {
-        "recyclable": 15, "compostable": 15, "reusable": 20,
-        "e-waste": 10, "hazardous": 10, "landfill": 5
+        result = dict(FALLBACK_CLASSIFICATION)
+        cacheable = False  # don't pin a parse failure to this image
+
+    return _finish_classification(result, cache_key, prepared["phash"], cacheable)
+
+
+async def classify_waste_packed(images: list[tuple[bytes | memoryview, str]]) -> list[dict]:
+    """
+    Classify several images with a single Gemini prompt that returns a JSON
+    array, cutting per-request overhead for batch audits. Cached images are
+    answered locally; if the array reply doesn't line up with the images,
+    they are retried one by one.
+    """
+    prepared_all = await asyncio.gather(
+        *(_prepare_classification(data, mime_type) for data, mime_type in images)
+    )
+
+    results: list[dict | None] = [None] * len(images)
+    pending = []  # (index, cache_key, prepared) still needing Gemini
+    for index, (cached, cache_key, prepared) in enumerate(prepared_all):
+        if cached:
+            results[index] = cached
+        else:
+            pending.append((index, cache_key, prepared))
+
+    if len(pending) == 1:
+        index, _, _ = pending[0]
+        results[index] = await classify_waste(*images[index])
+    elif pending:
+        _ensure_init()
+        model = GenerativeModel(MODEL_NAME)
+        parts = [
+            Part.from_data(prepared["data"], mime_type=prepared["mime_type"])
+            for _, _, prepared in pending
+        ]
+        response = await _call(lambda: model.generate_content_async(
+            [_batch_prompt(len(parts)), *parts],
+            generation_config=GenerationConfig(
+                temperature=0.3,
+                max_output_tokens=500 * len(parts),
+            )
+        ))
+
+        try:
+            replies = _parse_json_reply(response.text)
+        except json.JSONDecodeError:
+            replies = None
+
+        if isinstance(replies, list) and len(replies) == len(pending) and all(
+            isinstance(reply, dict) for reply in replies
+        ):
+            for (index, cache_key, prepared), reply in zip(pending, replies):
+                results[index] = _finish_classification(reply, cache_key, prepared["phash"])
+        else:
+            retried = await asyncio.gather(
+                *(classify_waste(*images[index]) for index, _, _ in pending)
+            )
+            for (index, _, _), result in zip(pending, retried):
+                results[index] = result
+
+    return results
+
+
+_ROUTE_TAGS = {f"[ROUTE:{agent_key}]": agent_key for agent_key in PATRIOTAI_AGENTS}
+
+
+def _routing_fields(agent_key: str | None) -> dict:
+    if not agent_key:
+        return {"route_to_patriotai": False, "patriotai_agent": None, "patriotai_reason": None}
+    agent_info = PATRIOTAI_AGENTS[agent_key]
+    return {
+        "route_to_patriotai": True,
+        "patriotai_agent": agent_key,
+        "patriotai_reason": f"This question can be better answered by {agent_info['name']} on PatriotAI — {agent_info['description']}",
     }
-    result["points_earned"] = points_map.get(result.get("category", "landfill"), 5)
-    return result
 
 
-async def eco_chat(message: str, history: list[dict] = None) -> dict:
+class _RouteTagFilter:
+    """
+    Strips [ROUTE:Agent] tags from a reply that arrives in chunks.
+
+    A tag can be split across chunk boundaries ("...[ROU" + "TE:NourishNet]"),
+    so any tail that could still grow into a tag is held back until the
+    next chunk decides it. The first tag seen sets `agent_key`.
+    """
+
+    def __init__(self):
+        self.agent_key: str | None = None
+        self._pending = ""
+
+    def feed(self, text: str) -> str:
+        """Add a chunk; returns the text that is safe to emit now."""
+        buffer = self._pending + text
+        out = []
+        while buffer:
+            start = buffer.find("[")
+            if start == -1:
+                out.append(buffer)
+                buffer = ""
+                break
+            out.append(buffer[:start])
+            buffer = buffer[start:]
+
+            end = buffer.find("]")
+            candidate = buffer if end == -1 else buffer[:end + 1]
+            if candidate in _ROUTE_TAGS:
+                self.agent_key = self.agent_key or _ROUTE_TAGS[candidate]
+                buffer = buffer[end + 1:]
+            elif end == -1 and any(tag.startswith(candidate) for tag in _ROUTE_TAGS):
+                break  # may be the start of a tag — wait for more text
+            else:
+                out.append("[")
+                buffer = buffer[1:]
+        self._pending = buffer
+        return "".join(out)
+
+    def flush(self) -> str:
+        """End of stream: release whatever was held back."""
+        rest, self._pending = self._pending, ""
+        return rest
+
+
+def to_content(msg: dict) -> Content:
+    """Convert one {"role", "content"} chat turn to a Gemini Content."""
+    role = "user" if msg["role"] == "user" else "model"
+    return Content(role=role, parts=[Part.from_text(msg["content"])])
+
+
+# ── History Compaction ──────────────────────────────────────────
+# Long conversations would otherwise send every turn to Gemini. We keep the
+# last CHAT_HISTORY_KEEP_TURNS turns verbatim, replace older turns with a
+# rolling summary (generated in the background, so no request waits on it),
+# and trim to CHAT_HISTORY_TOKEN_BUDGET.
+#
+# The summary lives on the ChatSession with the absolute index of the last
+# turn it covers (session.turn_offset counts turns trimmed off the front),
+# so it stays valid when the session drops its oldest turns. It is only
+# re-summarized once CHAT_SUMMARY_EVERY_TURNS older turns aren't covered.
+
+CHAT_HISTORY_KEEP_TURNS = int(os.getenv("CHAT_HISTORY_KEEP_TURNS", "8"))
+CHAT_HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "3000"))
+CHAT_SUMMARY_EVERY_TURNS = int(os.getenv("CHAT_SUMMARY_EVERY_TURNS", "6"))
+
+SUMMARY_PROMPT = """Summarize the earlier part of a conversation between a George Mason University student and GreenMason's EcoChat sustainability assistant.
+Keep the facts, the student's goals and preferences, and any open questions. Use at most 120 words, plain text.
+
+"""
+
+_background_tasks: set[asyncio.Task] = set()
+_prompt_sizes = deque(maxlen=500)  # (tokens_before, tokens_after) per chat call
+_compaction_counts = {"compacted": 0, "summaries_generated": 0, "summary_failures": 0}
+
+
+def _estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) — good enough for budgeting."""
+    return len(text) // 4 + 1
+
+
+async def _summarize(session, previous_summary: str | None, turns: list[dict], end: int):
+    """Fold `turns` into the previous summary and store it on the session as covering [0, end)."""
+    transcript = "\n".join(
+        f"{'Student' if turn['role'] == 'user' else 'Assistant'}: {turn['content']}" for turn in turns
+    )
+    prompt = SUMMARY_PROMPT
+    if previous_summary:
+        prompt += f"Summary so far:\n{previous_summary}\n\n"
+    prompt += f"Conversation:\n{transcript}"
+
+    try:
+        _ensure_init()
+        model = GenerativeModel(MODEL_NAME)
+        response = await _call(lambda: model.generate_content_async(
+            prompt,
+            generation_config=GenerationConfig(temperature=0.2, max_output_tokens=300),
+        ))
+        if end > session.summary_end:
+            session.summary = response.text.strip()
+            session.summary_end = end
+        _compaction_counts["summaries_generated"] += 1
+    except Exception as e:
+        _compaction_counts["summary_failures"] += 1
+        print(f"⚠️ Chat summary failed: {e}")
+    finally:
+        session.summarizing = False
+
+
+def compact_history(session) -> tuple[int, str | None]:
+    """
+    Decide what of `session.turns` to send. Returns (start, summary): the
+    prompt is the summary (if any) plus turns[start:]. Schedules a fresh
+    summary in the background once enough older turns aren't covered.
+    """
+    turns = session.turns
+    keep_from = max(0, len(turns) - CHAT_HISTORY_KEEP_TURNS)
+    summary = session.summary
+    start = max(0, session.summary_end - session.turn_offset) if summary else 0
+    start = min(start, keep_from)
+
+    if keep_from - start >= CHAT_SUMMARY_EVERY_TURNS and not session.summarizing:
+        session.summarizing = True
+        task = asyncio.create_task(
+            _summarize(session, summary, turns[start:keep_from], session.turn_offset + keep_from)
+        )
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+    # Token budget: drop the oldest verbatim turns, always keeping the last exchange
+    budget = CHAT_HISTORY_TOKEN_BUDGET - (_estimate_tokens(summary) if summary else 0)
+    tokens = sum(_estimate_tokens(turn["content"]) for turn in turns[start:])
+    while tokens > budget and len(turns) - start > 2:
+        tokens -= _estimate_tokens(turns[start]["content"])
+        start += 1
+
+    # Gemini history must open with a user turn
+    while start < len(turns) and turns[start]["role"] != "user":
+        start += 1
+
+    return start, summary
+
+
+def _build_chat(message: str, session, routing_rules: bool = True):
+    """
+    Start a chat from a chat_sessions.ChatSession, reusing the Gemini
+    Content objects it keeps per turn. History is compacted to the token
+    budget first. Without `routing_rules` the prompt drops the
+    [ROUTE:...] instructions.
+    """
+    history = session.turns
+    start, summary = compact_history(session)
+
+    tokens_before = sum(_estimate_tokens(turn["content"]) for turn in history) + _estimate_tokens(message)
+    tokens_after = (
+        sum(_estimate_tokens(turn["content"]) for turn in history[start:])
+        + (_estimate_tokens(summary) if summary else 0)
+        + _estimate_tokens(message)
+    )
+    _prompt_sizes.append((tokens_before, tokens_after))
+    if start or summary:
+        _compaction_counts["compacted"] += 1
+
+    system_instruction = [CHAT_SYSTEM_PROMPT]
+    if routing_rules:
+        system_instruction.append(CHAT_ROUTING_RULES)
+    if summary:
+        system_instruction.append(f"Summary of the earlier conversation with this student:\n{summary}")
+
     _ensure_init()
     model = GenerativeModel(
         MODEL_NAME,
-        system_instruction=CHAT_SYSTEM_PROMPT
+        system_instruction=system_instruction
     )
 
-    gemini_history = []
-    if history:
-        for msg in history:
-            role = "user" if msg["role"] == "user" else "model"
-            gemini_history.append(
-                Content(role=role, parts=[Part.from_text(msg["content"])])
-            )
+    return model.start_chat(history=session.contents[start:])
+
+
+def compaction_stats() -> dict:
+    """Prompt size (estimated tokens) before and after compaction."""
+    sizes = list(_prompt_sizes)
+    if not sizes:
+        return {"calls": 0, **_compaction_counts}
+
+    def p95(values):
+        return sorted(values)[int(0.95 * (len(values) - 1))]
+
+    before = [b for b, _ in sizes]
+    after = [a for _, a in sizes]
+    return {
+        "calls": len(sizes),
+        **_compaction_counts,
+        "avg_tokens_before": round(sum(before) / len(before), 1),
+        "avg_tokens_after": round(sum(after) / len(after), 1),
+        "p95_tokens_before": p95(before),
+        "p95_tokens_after": p95(after),
+        "keep_turns": CHAT_HISTORY_KEEP_TURNS,
+        "token_budget": CHAT_HISTORY_TOKEN_BUDGET,
+        "summary_every_turns": CHAT_SUMMARY_EVERY_TURNS,
+    }
+
+
+CHAT_GENERATION_CONFIG = GenerationConfig(
+    temperature=0.7,
+    max_output_tokens=800,
+)
+
 
-    chat = model.start_chat(history=gemini_history)
+async def eco_chat(message: str, session, routing_rules: bool = True) -> dict:
+    chat = _build_chat(message, session, routing_rules)
 
-    response = chat.send_message(
+    response = await _call(lambda: chat.send_message_async(
         message,
-        generation_config=GenerationConfig(
-            temperature=0.7,
-            max_output_tokens=800,
-        )
-    )
+        generation_config=CHAT_GENERATION_CONFIG,
+    ))
 
     reply_text = response.text.strip()
 
-    route_to_patriotai = False
     patriotai_agent = None
-    patriotai_reason = None
-
-    for agent_key, agent_info in PATRIOTAI_AGENTS.items():
-        tag = f"[ROUTE:{agent_key}]"
+    for tag, agent_key in _ROUTE_TAGS.items():
         if tag in reply_text:
-            route_to_patriotai = True
             patriotai_agent = agent_key
-            patriotai_reason = f"This question can be better answered by {agent_info['name']} on PatriotAI — {agent_info['description']}"
             reply_text = reply_text.replace(tag, "").strip()
             break
 
-    return {
-        "reply": reply_text,
-        "route_to_patriotai": route_to_patriotai,
-        "patriotai_agent": patriotai_agent,
-        "patriotai_reason": patriotai_reason
-    }
+    return {"reply": reply_text, **_routing_fields(patriotai_agent)}
+
+
+async def eco_chat_stream(message: str, session, routing_rules: bool = True):
+    """
+    Streaming variant of eco_chat.
+
+    Yields ("token", text) as Gemini produces the reply, with route tags
+    stripped on the fly, then one ("done", result) carrying the same dict
+    eco_chat returns.
+    """
+    chat = _build_chat(message, session, routing_rules)
+    tag_filter = _RouteTagFilter()
+    parts = []
+
+    async for chunk in _stream(lambda: chat.send_message_async(
+        message,
+        generation_config=CHAT_GENERATION_CONFIG,
+        stream=True,
+    )):
+        try:
+            chunk_text = chunk.text
+        except ValueError:
+            continue  # e.g. a final chunk carrying only finish metadata
+        text = tag_filter.feed(chunk_text)
+        if text:
+            parts.append(text)
+            yield "token", text
+
+    text = tag_filter.flush()
+    if text:
+        parts.append(text)
+        yield "token", text
+
+    yield "done", {"reply": "".join(parts).strip(), **_routing_fields(tag_filter.agent_key)}
 
 
 async def generate_daily_tip() -> str:
     _ensure_init()
     model = GenerativeModel(MODEL_NAME)
 
-    response = model.generate_content(
+    response = await _call(lambda: model.generate_content_async(
         "Generate a short, actionable sustainability tip for a college student at George Mason University. "
         "Make it specific, practical, and encouraging. Keep it under 50 words. "
         "Add a Valentine's Day / love-for-earth twist if possible.",
@@ -245,6 +652,6 @@ async def generate_daily_tip() -> str:
             temperature=0.9,
             max_output_tokens=100,
         )
-    )
+    ))
 
     return response.text.strip()
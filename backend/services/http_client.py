@@ -0,0 +1,106 @@
+"""Shared outbound HTTP client for upstream APIs (ElevenLabs, ...).
+
+One httpx.AsyncClient is created in main.py's lifespan and closed on
+shutdown, so upstream calls reuse pooled keep-alive connections instead
+of paying a TCP + TLS handshake per request.
+
+Pool size, keep-alive and the connect/read/write/pool timeouts are
+configurable. HTTP_HTTP2=1 enables HTTP/2 (needs the `h2` package).
+"""
+
+import os
+from typing import Optional
+
+import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))
+HTTP_WRITE_TIMEOUT = float(os.getenv("HTTP_WRITE_TIMEOUT", "10"))
+HTTP_POOL_TIMEOUT = float(os.getenv("HTTP_POOL_TIMEOUT", "5"))
+HTTP_HTTP2 = os.getenv("HTTP_HTTP2", "") == "1"
+
+_client: Optional[httpx.AsyncClient] = None
+_stats = {"requests": 0, "connections_opened": 0, "http2_requests": 0}
+
+
+async def _trace(event: str, info: dict):
+    # httpcore reports each new TCP connection; every other request rode
+    # on a pooled one.
+    if event == "connection.connect_tcp.complete":
+        _stats["connections_opened"] += 1
+
+
+async def _on_request(request: httpx.Request):
+    _stats["requests"] += 1
+    request.extensions["trace"] = _trace
+
+
+async def _on_response(response: httpx.Response):
+    if response.http_version == "HTTP/2":
+        _stats["http2_requests"] += 1
+
+
+def _http2_available() -> bool:
+    if not HTTP_HTTP2:
+        return False
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        print("⚠️ HTTP_HTTP2=1 but the h2 package is missing, using HTTP/1.1")
+        return False
+
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=_http2_available(),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(
+            connect=HTTP_CONNECT_TIMEOUT,
+            read=HTTP_READ_TIMEOUT,
+            write=HTTP_WRITE_TIMEOUT,
+            pool=HTTP_POOL_TIMEOUT,
+        ),
+        event_hooks={"request": [_on_request], "response": [_on_response]},
+    )
+
+
+def start():
+    """Create the shared client (called from the lifespan hook)."""
+    global _client
+    if _client is None:
+        _client = _create_client()
+
+
+async def stop():
+    """Close pooled connections on shutdown."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """The shared client, created on first use outside the app lifespan."""
+    if _client is None:
+        start()
+    return _client
+
+
+def stats() -> dict:
+    requests = _stats["requests"]
+    reused = max(0, requests - _stats["connections_opened"])
+    return {
+        **_stats,
+        "connections_reused": reused,
+        "reuse_rate": round(reused / requests, 4) if requests else 0.0,
+        "http2": HTTP_HTTP2,
+        "max_connections": HTTP_MAX_CONNECTIONS,
+    }
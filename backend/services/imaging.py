@@ -0,0 +1,226 @@
+"""Image helpers for Snap & Sort (hashing, validation, preprocessing).
+
+Photos are normalized before they reach Gemini Vision: decoded, rotated
+upright, downscaled to IMAGE_MAX_DIMENSION, stripped of EXIF and re-encoded
+as JPEG or WebP. Decoding a 12 MP photo is CPU-heavy, so the work runs in a
+process pool (started from main.py's lifespan) instead of on the event loop.
+"""
+
+import io
+import os
+import time
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1024"))
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper()  # JPEG or WEBP
+IMAGE_OUTPUT_QUALITY = int(os.getenv("IMAGE_OUTPUT_QUALITY", "85"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))  # 0 = use a thread instead
+
+_OUTPUT_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+# Originals Gemini accepts as-is, kept when re-encoding wouldn't shrink them
+_PASSTHROUGH_MIME_TYPES = {"image/jpeg", "image/png", "image/webp"}
+# img.info keys that carry EXIF/XMP/IPTC-style metadata
+_METADATA_KEYS = ("exif", "xmp", "XML:com.adobe.xmp", "comment", "photoshop")
+
+# Leading bytes needed to recognise every format in sniff_image_type()
+SNIFF_BYTES = 16
+
+# dHash grid: 9x8 greyscale pixels give 8 horizontal gradients per row -> 64 bits
+_DHASH_WIDTH = 9
+_DHASH_HEIGHT = 8
+
+_pool: Optional[ProcessPoolExecutor] = None
+_stats = {
+    "images": 0,
+    "passthrough": 0,
+    "bytes_before": 0,
+    "bytes_after": 0,
+    "total_ms": 0.0,
+}
+
+
+def sniff_image_type(header: bytes | memoryview) -> Optional[str]:
+    """
+    Identify an image by its magic bytes, ignoring whatever MIME type the
+    client claimed. Returns the MIME type, or None for non-images.
+    """
+    head = bytes(header[:SNIFF_BYTES])
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    return None
+
+
+# ── Perceptual Hashing ──────────────────────────────────────────
+
+def _dhash(img: Image.Image) -> int:
+    """
+    64-bit difference hash (dHash) of a decoded image. Near-duplicate
+    photos (re-encoded, slightly resized, different lighting) land within
+    a few bits of each other.
+    """
+    small = img.convert("L").resize((_DHASH_WIDTH, _DHASH_HEIGHT), Image.Resampling.BILINEAR)
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(_DHASH_HEIGHT):
+        offset = row * _DHASH_WIDTH
+        for col in range(_DHASH_WIDTH - 1):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two perceptual hashes."""
+    return (a ^ b).bit_count()
+
+
+# ── Normalization ───────────────────────────────────────────────
+
+def _has_metadata(img: Image.Image) -> bool:
+    """Whether the file carries EXIF (GPS, camera), XMP, comments or PNG text."""
+    if any(key in img.info for key in _METADATA_KEYS):
+        return True
+    if getattr(img, "text", None):  # PNG tEXt/iTXt/zTXt chunks
+        return True
+    return len(img.getexif()) > 0
+
+
+def prepare_image(
+    image_bytes: bytes,
+    mime_type: str,
+    max_dimension: int = IMAGE_MAX_DIMENSION,
+    output_format: str = IMAGE_OUTPUT_FORMAT,
+    quality: int = IMAGE_OUTPUT_QUALITY,
+) -> dict:
+    """
+    Decode, downscale, strip metadata and re-encode one image, and compute
+    its perceptual hash from the same decode. Runs inside a pool worker.
+
+    Images Pillow can't decode (e.g. HEIC without a plugin) pass through
+    unchanged with no perceptual hash. Already-small JPEG/PNG/WebP files
+    that re-encoding wouldn't shrink also pass through (with their hash),
+    but only if they carry no metadata; otherwise the re-encode is sent.
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            has_metadata = _has_metadata(img)
+            # JPEG can decode straight to a smaller scale
+            img.draft("RGB", (max_dimension, max_dimension))
+            img = ImageOps.exif_transpose(img)
+            img.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+            phash = _dhash(img)
+
+            if output_format == "JPEG" and img.mode != "RGB":
+                if img.mode in ("RGBA", "LA", "P"):
+                    img = img.convert("RGBA")
+                    background = Image.new("RGB", img.size, (255, 255, 255))
+                    background.paste(img, mask=img.getchannel("A"))
+                    img = background
+                else:
+                    img = img.convert("RGB")
+
+            out = io.BytesIO()
+            # No exif= argument, so EXIF/GPS metadata is dropped
+            img.save(out, format=output_format, quality=quality, optimize=True)
+            data = out.getvalue()
+            width, height = img.size
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return {
+            "data": image_bytes,
+            "mime_type": mime_type,
+            "phash": None,
+            "normalized": False,
+            "bytes_before": len(image_bytes),
+            "bytes_after": len(image_bytes),
+        }
+
+    if len(data) >= len(image_bytes) and mime_type in _PASSTHROUGH_MIME_TYPES and not has_metadata:
+        return {
+            "data": image_bytes,
+            "mime_type": mime_type,
+            "phash": phash,
+            "normalized": False,
+            "bytes_before": len(image_bytes),
+            "bytes_after": len(image_bytes),
+        }
+
+    return {
+        "data": data,
+        "mime_type": _OUTPUT_MIME_TYPES.get(output_format, "image/jpeg"),
+        "phash": phash,
+        "normalized": True,
+        "width": width,
+        "height": height,
+        "bytes_before": len(image_bytes),
+        "bytes_after": len(data),
+    }
+
+
+def start_pool():
+    """Start the normalization worker processes."""
+    global _pool
+    if IMAGE_WORKERS > 0 and _pool is None:
+        # forkserver: don't fork a parent that already runs Motor/HTTP threads
+        _pool = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+        print(f"🖼️ Image pool started ({IMAGE_WORKERS} workers)")
+
+
+def stop_pool():
+    """Shut the worker processes down."""
+    global _pool
+    if _pool:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def normalize(image_bytes: bytes | memoryview, mime_type: str = "image/jpeg") -> dict:
+    """
+    Normalize an image off the event loop. Returns prepare_image()'s dict:
+    data, mime_type, phash and before/after byte sizes.
+    """
+    started = time.perf_counter()
+    # Arguments are pickled to the worker, so hand it a bytes object
+    data = image_bytes if isinstance(image_bytes, bytes) else bytes(image_bytes)
+    if _pool:
+        loop = asyncio.get_running_loop()
+        prepared = await loop.run_in_executor(_pool, prepare_image, data, mime_type)
+    else:
+        prepared = await asyncio.to_thread(prepare_image, data, mime_type)
+
+    _stats["images"] += 1
+    _stats["passthrough"] += 0 if prepared["normalized"] else 1
+    _stats["bytes_before"] += prepared["bytes_before"]
+    _stats["bytes_after"] += prepared["bytes_after"]
+    _stats["total_ms"] += (time.perf_counter() - started) * 1000
+    return prepared
+
+
+def stats() -> dict:
+    """Before/after byte sizes across all normalized images."""
+    images = _stats["images"]
+    return {
+        "images": images,
+        "passthrough": _stats["passthrough"],
+        "bytes_before": _stats["bytes_before"],
+        "bytes_after": _stats["bytes_after"],
+        "size_ratio": round(_stats["bytes_after"] / _stats["bytes_before"], 4) if _stats["bytes_before"] else 0.0,
+        "avg_ms": round(_stats["total_ms"] / images, 2) if images else 0.0,
+        "max_dimension": IMAGE_MAX_DIMENSION,
+        "output_format": IMAGE_OUTPUT_FORMAT,
+        "workers": IMAGE_WORKERS if _pool else 0,
+    }
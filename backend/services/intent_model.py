@@ -0,0 +1,307 @@
+"""Local intent model for PatriotAI routing.
+
+A small multinomial logistic regression over hashed word features
+(unigrams, 5-letter prefixes, bigrams), trained with NumPy at startup from
+the agents' example queries, keywords and descriptions in patriotai.py,
+a set of general sustainability questions that should stay in EcoChat,
+and optionally labeled chat logs from INTENT_TRAINING_FILE (JSON lines of
+{"message": ..., "agent": "NourishNet" | null}).
+
+Routing by the model is opt-in: set INTENT_ROUTING_CONFIDENCE to 1 or
+below and train() also cross-validates on the held-out phrasings (never
+the bare keywords). Only if the confident held-out predictions reach
+INTENT_MIN_ACCURACY does EcoChat take the model's routing decision and
+leave the routing rules out of the Gemini prompt; otherwise nothing is
+ever "confident" and Gemini keeps routing. classify_batch() scores any
+number of messages with one gather-and-sum over the weight matrix, for
+offline analysis.
+"""
+
+import os
+import json
+import time
+import zlib
+from typing import Optional
+
+import numpy as np
+
+from services.patriotai import AGENTS, split_words
+
+INTENT_ROUTING_CONFIDENCE = float(os.getenv("INTENT_ROUTING_CONFIDENCE", "1.01"))  # > 1 disables
+INTENT_MIN_ACCURACY = float(os.getenv("INTENT_MIN_ACCURACY", "0.95"))
+INTENT_TRAINING_FILE = os.getenv("INTENT_TRAINING_FILE")
+INTENT_FEATURES = 1 << 14
+INTENT_EPOCHS = 1000
+INTENT_LEARNING_RATE = 20.0
+INTENT_L2 = 1e-4
+INTENT_FOLDS = 5
+
+# Function words that carry no routing signal
+_STOPWORDS = frozenset("""
+a an the and or but if of to in on at by for with about from into is are was were be
+am do does did have has had can could should would will i me my we our you your it its
+they them this that these those there here what which who when where why how please
+""".split())
+
+# Questions EcoChat answers itself (no PatriotAI route)
+GENERAL_EXAMPLES = [
+    "Is a pizza box recyclable?",
+    "Where do I recycle batteries on campus?",
+    "Can I compost paper towels?",
+    "What bin does a coffee cup go in?",
+    "How can I reduce plastic waste in my dorm?",
+    "Give me a daily green challenge",
+    "What are some easy ways to save energy?",
+    "How does composting help the environment?",
+    "Where are the recycling bins in the Johnson Center?",
+    "Is styrofoam recyclable?",
+    "How do I get rid of old electronics?",
+    "What is carbon neutrality?",
+    "Tips for a more sustainable lifestyle",
+    "How can I get around campus without a car?",
+    "Does GMU have a bike share?",
+    "What sustainability programs does Mason have?",
+    "Are plastic bags recyclable?",
+    "How do I dispose of paint or chemicals?",
+    "What is the Office of Sustainability?",
+    "Why is recycling important?",
+    "How much water does a shower use?",
+    "Can glass jars go in the recycling?",
+    "What should I do with food scraps?",
+    "How do reusable containers work at campus dining?",
+    "Hi there!",
+    "Thanks, that was helpful",
+    "What can you help me with?",
+    "How do I earn more green score points?",
+]
+
+# More phrasings per agent, from the topics in Gemini's routing rules
+AGENT_EXAMPLES = {
+    "PatriotPal": [
+        "When is the deadline to add or drop a class?",
+        "How do I apply for housing next semester?",
+        "Where do I buy a parking permit?",
+        "What are the campus policies on guests in the dorms?",
+        "How do I request my transcript?",
+        "Who is my academic advisor?",
+        "How do I apply for scholarships?",
+        "When is tuition due?",
+    ],
+    "NourishNet": [
+        "I can't afford groceries this week",
+        "I'm hungry and out of money, where can I eat?",
+        "Is there a food pantry at Mason?",
+        "Does the campus food bank need an appointment?",
+        "Can I use SNAP or EBT on campus?",
+        "Which dining halls are open for dinner?",
+        "How do I change my meal plan?",
+    ],
+    "CourseMate": [
+        "Can you help me study for my biology midterm?",
+        "Explain this concept from my lecture",
+        "Quiz me on chapter 3 of my textbook",
+        "I don't understand my homework assignment",
+        "Make me a practice test for my final",
+        "How do I find a tutor for calculus?",
+    ],
+    "DocuMate": [
+        "Summarize this PDF",
+        "Pull the key points out of this document",
+        "Compare these two research papers",
+        "Help me write a literature review",
+        "What are the main findings of this paper?",
+    ],
+}
+
+_labels: list[Optional[str]] = [None, *AGENTS]  # None = no route
+_weights: Optional[np.ndarray] = None  # (INTENT_FEATURES, classes)
+_bias: Optional[np.ndarray] = None
+_routing_enabled = False
+_stats = {"examples": 0, "train_ms": 0.0, "classified": 0, "confident": 0, "validation": None}
+
+
+def _hash(term: str) -> int:
+    return zlib.crc32(term.encode()) & (INTENT_FEATURES - 1)
+
+
+def _features(message: str) -> list[int]:
+    """Distinct hashed features; "<s>" is always present, so none is empty."""
+    words = [w for w in split_words(message) if w not in _STOPWORDS]
+    terms = {"<s>", *words}
+    terms.update(f"{w[:5]}~" for w in words if len(w) > 5)
+    terms.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+    return sorted({_hash(term) for term in terms})
+
+
+def _encode(messages: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(feature indices, segment offsets, features per message), flattened."""
+    features = [_features(message) for message in messages]
+    counts = np.fromiter((len(f) for f in features), dtype=np.int64, count=len(features))
+    offsets = np.zeros(len(features), dtype=np.int64)
+    np.cumsum(counts[:-1], out=offsets[1:])
+    indices = np.fromiter((i for f in features for i in f), dtype=np.int64, count=int(counts.sum()))
+    return indices, offsets, counts
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    logits = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(logits)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def _training_data() -> tuple[list[str], list[int], list[bool]]:
+    """Messages, label indices, and which messages are phrasings to validate on."""
+    messages, labels, phrasings = [], [], []
+
+    def add(message: str, label: Optional[str], phrasing: bool = True):
+        messages.append(message)
+        labels.append(_labels.index(label))
+        phrasings.append(phrasing)
+
+    for message in GENERAL_EXAMPLES:
+        add(message, None)
+    for agent_key, agent in AGENTS.items():
+        for message in [*agent["example_queries"], *AGENT_EXAMPLES.get(agent_key, [])]:
+            add(message, agent_key)
+        for message in [*agent["keywords"], agent["description"]]:
+            add(message, agent_key, phrasing=False)
+
+    if INTENT_TRAINING_FILE and os.path.exists(INTENT_TRAINING_FILE):
+        with open(INTENT_TRAINING_FILE) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("agent") in _labels:
+                    add(record["message"], record.get("agent"))
+    return messages, labels, phrasings
+
+
+def _fit(messages: list[str], labels: list[int]) -> tuple[np.ndarray, np.ndarray]:
+    indices, offsets, counts = _encode(messages)
+    # Fit only the columns the training data uses; the rest stay zero
+    columns, compact = np.unique(indices, return_inverse=True)
+    rows = np.repeat(np.arange(len(messages)), counts)
+    x = np.zeros((len(messages), len(columns)), dtype=np.float32)
+    x[rows, compact] = 1 / np.sqrt(counts[rows])
+
+    y = np.zeros((len(messages), len(_labels)), dtype=np.float32)
+    y[np.arange(len(messages)), labels] = 1
+    # Balanced classes: the agents have far more keywords than examples
+    sample_weight = ((1 / y.sum(axis=0))[labels] * len(messages) / len(_labels)).astype(np.float32)
+
+    fitted = np.zeros((len(columns), len(_labels)), dtype=np.float32)
+    bias = np.zeros(len(_labels), dtype=np.float32)
+    for _ in range(INTENT_EPOCHS):
+        error = (_softmax(x @ fitted + bias) - y) * sample_weight[:, None] / len(messages)
+        fitted -= INTENT_LEARNING_RATE * (x.T @ error + INTENT_L2 * fitted)
+        bias -= INTENT_LEARNING_RATE * error.sum(axis=0)
+
+    weights = np.zeros((INTENT_FEATURES, len(_labels)), dtype=np.float32)
+    weights[columns] = fitted
+    return weights, bias
+
+
+def _predict(weights: np.ndarray, bias: np.ndarray, messages: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """(best label index, its probability) per message."""
+    indices, offsets, counts = _encode(messages)
+    logits = np.add.reduceat(weights[indices], offsets, axis=0) / np.sqrt(counts)[:, None] + bias
+    probabilities = _softmax(logits)
+    best = probabilities.argmax(axis=1)
+    return best, probabilities[np.arange(len(messages)), best]
+
+
+def _validate(messages: list[str], labels: list[int], phrasings: list[bool]) -> dict:
+    """
+    INTENT_FOLDS-fold cross-validation over the phrasings: each fold is
+    predicted by a model fitted without it. Reports accuracy over all of
+    them and over the ones confident at INTENT_ROUTING_CONFIDENCE.
+    """
+    held_out = [i for i, phrasing in enumerate(phrasings) if phrasing]
+    correct, confident, confident_correct = 0, 0, 0
+    for fold in range(INTENT_FOLDS):
+        test = set(held_out[fold::INTENT_FOLDS])
+        train_ids = [i for i in range(len(messages)) if i not in test]
+        weights, bias = _fit([messages[i] for i in train_ids], [labels[i] for i in train_ids])
+        best, confidence = _predict(weights, bias, [messages[i] for i in test])
+        for i, label, p in zip(test, best, confidence):
+            hit = int(label == labels[i])
+            correct += hit
+            if p >= INTENT_ROUTING_CONFIDENCE:
+                confident += 1
+                confident_correct += hit
+    return {
+        "held_out": len(held_out),
+        "accuracy": round(correct / len(held_out), 4),
+        "confident": confident,
+        "confident_accuracy": round(confident_correct / confident, 4) if confident else None,
+    }
+
+
+def train():
+    """Fit the model (called from the lifespan hook; takes well under a second)."""
+    global _weights, _bias, _routing_enabled
+    started = time.perf_counter()
+
+    messages, labels, phrasings = _training_data()
+    if INTENT_ROUTING_CONFIDENCE <= 1:
+        validation = _validate(messages, labels, phrasings)
+        _stats["validation"] = validation
+        _routing_enabled = (validation["confident_accuracy"] or 0) >= INTENT_MIN_ACCURACY
+        print(
+            f"🧭 Intent model held-out accuracy {validation['confident_accuracy']} on "
+            f"{validation['confident']}/{validation['held_out']} confident phrasings"
+            f" — routing {'on' if _routing_enabled else 'off (below INTENT_MIN_ACCURACY)'}"
+        )
+
+    _weights, _bias = _fit(messages, labels)
+    _stats["examples"] = len(messages)
+    _stats["train_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    print(f"🧭 Intent model trained ({len(messages)} examples, {_stats['train_ms']}ms)")
+
+
+def classify_batch(messages: list[str]) -> list[dict]:
+    """
+    Route probabilities for many messages at once.
+
+    Returns one {"agent_key", "confidence", "confident"} per message;
+    agent_key is None when the message should stay in EcoChat. Nothing is
+    confident unless routing is enabled and passed validation.
+    """
+    if _weights is None:
+        train()
+    if not messages:
+        return []
+
+    best, confidence = _predict(_weights, _bias, messages)
+    results = [
+        {
+            "agent_key": _labels[label],
+            "confidence": round(float(p), 4),
+            "confident": _routing_enabled and bool(p >= INTENT_ROUTING_CONFIDENCE),
+        }
+        for label, p in zip(best, confidence)
+    ]
+    _stats["classified"] += len(results)
+    _stats["confident"] += sum(r["confident"] for r in results)
+    return results
+
+
+def routing_enabled() -> bool:
+    """Whether the model may route chat (opted in and passed validation)."""
+    return _routing_enabled
+
+
+def classify(message: str) -> dict:
+    return classify_batch([message])[0]
+
+
+def stats() -> dict:
+    return {
+        "trained": _weights is not None,
+        "labels": [label or "none" for label in _labels],
+        "routing_enabled": _routing_enabled,
+        "confidence_threshold": INTENT_ROUTING_CONFIDENCE,
+        "min_accuracy": INTENT_MIN_ACCURACY,
+        **_stats,
+    }
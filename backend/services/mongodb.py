@@ -2,15 +2,31 @@
 
 import os
 import ssl
+import json
+import base64
+import asyncio
 import certifi
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from typing import Optional
 
 # MongoDB connection (initialized in main.py startup)
 client: Optional[AsyncIOMotorClient] = None
 db = None
 
+# Running totals behind /api/stats live in one counters document
+COUNTERS_ID = "global"
+
+# Green Score points for making a Love Pledge
+PLEDGE_POINTS = 20
+
+# Persisted EcoChat sessions expire with the in-memory ones
+CHAT_SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_SECONDS", "7200"))
+
 
 async def connect():
     """Connect to MongoDB Atlas."""
@@ -37,7 +53,22 @@ async def connect():
     await db.users.create_index("total_score")
     await db.actions.create_index("username")
     await db.actions.create_index("created_at")
-    await db.pledges.create_index("created_at")
+    # A user's recent actions, newest first (dashboard)
+    await db.actions.create_index([("username", 1), ("created_at", -1)])
+    # Pledge wall pages walk (created_at, _id) newest first
+    await db.pledges.create_index([("created_at", -1), ("_id", -1)])
+    await db.chat_sessions.create_index("updated_at", expireAfterSeconds=CHAT_SESSION_TTL_SECONDS)
+
+    # Per-user daily point rollups for the windowed leaderboards
+    await db.score_rollups.create_index([("day", 1), ("username", 1)], unique=True)
+
+    # Counters are maintained incrementally from here on; seed them once
+    if await db.counters.find_one({"_id": COUNTERS_ID}, {"_id": 1}) is None:
+        await rebuild_counters()
+        print("📊 Global counters built")
+    if await db.score_rollups.find_one({}, {"_id": 1}) is None and await db.actions.find_one({}, {"_id": 1}):
+        await backfill_rollups()
+        print("📈 Score rollups backfilled")
 
 
 async def disconnect():
@@ -69,6 +100,7 @@ async def create_user(username: str, display_name: str = None) -> dict:
     }
     result = await db.users.insert_one(user)
     user["_id"] = str(result.inserted_id)
+    await increment_counters(users=1)
     return user
 
 
@@ -80,22 +112,41 @@ async def get_user(username: str) -> Optional[dict]:
     return user
 
 
+async def get_user_with_actions(username: str, actions_limit: int = 10) -> Optional[dict]:
+    """A user plus their most recent actions (as "recent_actions"), in one aggregation."""
+    pipeline = [
+        {"$match": {"username": username}},
+        {"$lookup": {
+            "from": "actions",
+            "localField": "username",
+            "foreignField": "username",
+            "pipeline": [
+                {"$sort": {"created_at": -1}},
+                {"$limit": actions_limit},
+                {"$project": {"_id": 0, "action": 1, "points": 1, "description": 1, "created_at": 1}},
+            ],
+            "as": "recent_actions",
+        }},
+    ]
+    users = await db.users.aggregate(pipeline).to_list(1)
+    if not users:
+        return None
+    user = users[0]
+    user["_id"] = str(user["_id"])
+    return user
+
+
 # ── Score Actions ───────────────────────────────────────────────
 
-async def log_action(username: str, action: str, points: int, description: str = None) -> dict:
+async def _apply_action(username: str, action: str, points: int, description: str = None) -> dict:
     """
-    Log a scoring action and update user's total score.
-
-    Action types: sort, challenge, quiz, pledge, chat
+    Record an action and add its points in one round trip: the action
+    insert runs concurrently with an upserting find_one_and_update that
+    creates the user if needed and returns the updated document, so the
+    new total is exact without a second read.
     """
     now = datetime.now(timezone.utc)
 
-    # Ensure user exists
-    user = await get_user(username)
-    if not user:
-        user = await create_user(username)
-
-    # Log the action
     action_doc = {
         "username": username,
         "action": action,
@@ -103,22 +154,52 @@ async def log_action(username: str, action: str, points: int, description: str =
         "description": description,
         "created_at": now,
     }
-    await db.actions.insert_one(action_doc)
 
-    # Update user score
-    await db.users.update_one(
-        {"username": username},
-        {
-            "$inc": {"total_score": points, "actions_count": 1},
-            "$set": {"last_active": now}
+    async def update_user() -> dict:
+        # findAndModify as a command (rather than find_one_and_update) so the
+        # reply says whether the upsert created the user
+        command = {
+            "findAndModify": "users",
+            "query": {"username": username},
+            "update": {
+                "$inc": {"total_score": points, "actions_count": 1},
+                "$set": {"last_active": now},
+                "$setOnInsert": {"display_name": username, "created_at": now},
+            },
+            "new": True,
+            "upsert": True,
         }
+        try:
+            reply = await db.command(command)
+        except OperationFailure as e:
+            if e.code != 11000:
+                raise
+            # Two first-ever actions raced on the upsert; the user exists now
+            reply = await db.command(command)
+        if not reply["lastErrorObject"].get("updatedExisting", True):
+            await increment_counters(users=1)
+        return reply["value"]
+
+    user, _, _, _ = await asyncio.gather(
+        update_user(),
+        db.actions.insert_one(action_doc),
+        increment_counters(actions={action: 1}, points=points),
+        increment_rollups([(username, now, points, 1)]),
     )
+    return user
+
 
-    updated_user = await get_user(username)
+async def log_action(username: str, action: str, points: int, description: str = None) -> dict:
+    """
+    Log a scoring action and update user's total score.
+
+    Action types: sort, challenge, quiz, pledge, chat
+    """
+    user = await _apply_action(username, action, points, description)
     return {
         "username": username,
         "points_added": points,
-        "new_total": updated_user["total_score"],
+        "new_total": user["total_score"],
         "action": action,
     }
 
@@ -147,72 +228,299 @@ async def get_leaderboard(limit: int = 20) -> list[dict]:
     return leaderboard
 
 
-async def get_user_rank(username: str) -> int:
-    """Get a user's rank on the leaderboard."""
-    user = await get_user(username)
-    if not user:
-        return 0
+async def get_user_rank(username: str, score: int = None) -> int:
+    """
+    Get a user's rank on the leaderboard straight from MongoDB (the
+    rank_index service answers this from memory once it's built).
+    """
+    if score is None:
+        user = await get_user(username)
+        if not user:
+            return 0
+        score = user["total_score"]
 
     # Count users with higher scores
     count = await db.users.count_documents(
-        {"total_score": {"$gt": user["total_score"]}}
+        {"total_score": {"$gt": score}}
     )
     return count + 1
 
 
+async def get_rank_entries() -> list[dict]:
+    """Every user's score and leaderboard fields, for building the rank index."""
+    cursor = db.users.find(
+        {},
+        {"_id": 0, "username": 1, "display_name": 1, "total_score": 1, "actions_count": 1}
+    )
+    return await cursor.to_list(None)
+
+
+# ── Windowed Leaderboards ───────────────────────────────────────
+#
+# score_rollups holds one document per user per UTC day:
+#   {"day": "YYYY-MM-DD", "username", "points", "actions"}
+# so a week's leaderboard reads seven days of buckets, not every action.
+
+LEADERBOARD_WINDOWS = ("day", "week", "month", "semester")
+
+
+def _day(when: datetime) -> str:
+    return when.strftime("%Y-%m-%d")
+
+
+def window_start(window: str, now: datetime = None) -> str:
+    """
+    First day (YYYY-MM-DD, UTC) of a leaderboard window. Weeks start on
+    Monday; semesters are Spring (Jan-May), Summer (Jun-Jul) and Fall (Aug-Dec).
+    """
+    now = now or datetime.now(timezone.utc)
+    if window == "day":
+        start = now
+    elif window == "week":
+        start = now - timedelta(days=now.weekday())
+    elif window == "month":
+        start = now.replace(day=1)
+    elif window == "semester":
+        month = 1 if now.month <= 5 else 6 if now.month <= 7 else 8
+        start = now.replace(month=month, day=1)
+    else:
+        raise ValueError(f"Unknown leaderboard window: {window}")
+    return _day(start)
+
+
+async def increment_rollups(entries: list[tuple[str, datetime, int, int]]):
+    """Add (username, when, points, actions) to the matching daily rollups."""
+    totals = {}
+    for username, when, points, actions in entries:
+        key = (_day(when), username)
+        p, a = totals.get(key, (0, 0))
+        totals[key] = (p + points, a + actions)
+    if not totals:
+        return
+    await db.score_rollups.bulk_write([
+        UpdateOne(
+            {"day": day, "username": username},
+            {"$inc": {"points": points, "actions": actions}},
+            upsert=True,
+        )
+        for (day, username), (points, actions) in totals.items()
+    ], ordered=False)
+
+
+async def get_window_leaderboard(window: str, limit: int = 20) -> list[dict]:
+    """Top users by points earned in the window, same shape as get_leaderboard."""
+    pipeline = [
+        {"$match": {"day": {"$gte": window_start(window)}}},
+        {"$group": {"_id": "$username", "points": {"$sum": "$points"}, "actions": {"$sum": "$actions"}}},
+        {"$match": {"points": {"$gt": 0}}},
+        {"$sort": {"points": -1, "_id": 1}},
+        {"$limit": limit},
+        {"$lookup": {"from": "users", "localField": "_id", "foreignField": "username", "as": "user"}},
+    ]
+
+    leaderboard = []
+    async for doc in db.score_rollups.aggregate(pipeline):
+        user = doc["user"][0] if doc["user"] else {}
+        leaderboard.append({
+            "rank": len(leaderboard) + 1,
+            "username": doc["_id"],
+            "display_name": user.get("display_name", doc["_id"]),
+            "total_score": doc["points"],
+            "actions_count": doc["actions"],
+        })
+    return leaderboard
+
+
+async def backfill_rollups() -> int:
+    """
+    Rebuild the daily rollups from the actions collection (a full scan,
+    done server-side with $merge). Existing rollup days are replaced, so
+    it's safe to re-run; points logged while it runs can be overwritten,
+    so run it when traffic is low. Returns the number of rollup documents.
+    """
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "day": {"$dateToString": {"format": "%Y-%m-%d", "date": "$created_at"}},
+                "username": "$username",
+            },
+            "points": {"$sum": "$points"},
+            "actions": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0,
+            "day": "$_id.day",
+            "username": "$_id.username",
+            "points": 1,
+            "actions": 1,
+        }},
+        {"$merge": {
+            "into": "score_rollups",
+            "on": ["day", "username"],
+            "whenMatched": "replace",
+            "whenNotMatched": "insert",
+        }},
+    ]
+    await db.actions.aggregate(pipeline).to_list(None)
+    return await db.score_rollups.count_documents({})
+
+
 # ── Love Pledges ────────────────────────────────────────────────
 
 async def create_pledge(username: str, pledge_text: str) -> dict:
-    """Create a Love Pledge to Earth."""
+    """
+    Create a Love Pledge to Earth. The PLEDGE_POINTS award is logged by the
+    caller through score_buffer, like any other score action.
+    """
     now = datetime.now(timezone.utc)
 
-    user = await get_user(username)
-    if not user:
-        user = await create_user(username)
+    user = await db.users.find_one({"username": username}, {"_id": 0, "display_name": 1})
 
     pledge = {
         "username": username,
-        "display_name": user.get("display_name", username),
+        "display_name": (user or {}).get("display_name", username),
         "pledge_text": pledge_text,
         "created_at": now,
         "likes": 0,
     }
-    result = await db.pledges.insert_one(pledge)
+    result, _ = await asyncio.gather(
+        db.pledges.insert_one(pledge), increment_counters(pledges=1)
+    )
     pledge["_id"] = str(result.inserted_id)
-
-    # Award points for making a pledge
-    await log_action(username, "pledge", 20, f"Love Pledge: {pledge_text[:50]}...")
+    pledge["id"] = pledge["_id"]
 
     return pledge
 
 
-async def get_pledges(limit: int = 50) -> list[dict]:
-    """Get recent pledges (Love Letters to Earth wall)."""
-    cursor = db.pledges.find(
-        {},
-        {"_id": 0, "username": 1, "display_name": 1, "pledge_text": 1, "created_at": 1, "likes": 1}
-    ).sort("created_at", -1).limit(limit)
+def _encode_cursor(pledge: dict) -> str:
+    position = {"t": pledge["created_at"].isoformat(), "id": str(pledge["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode("utf-8")).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, ObjectId]:
+    try:
+        position = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(position["t"]), ObjectId(position["id"])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise ValueError("Invalid pledge cursor")
 
+
+async def get_pledges(limit: int = 50, cursor: str = None) -> tuple[list[dict], Optional[str]]:
+    """
+    Get a page of pledges (Love Letters to Earth wall), newest first.
+
+    Pages are keyset-paginated on (created_at, _id): pass the returned
+    cursor to get the next page, which costs the same however deep it is.
+    The cursor is None on the last page.
+    """
+    query = {}
+    if cursor:
+        created_at, pledge_id = _decode_cursor(cursor)
+        query = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": pledge_id}},
+        ]}
+
+    docs = await db.pledges.find(
+        query,
+        {"username": 1, "display_name": 1, "pledge_text": 1, "created_at": 1, "likes": 1}
+    ).sort([("created_at", -1), ("_id", -1)]).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = _encode_cursor(docs[limit - 1]) if len(docs) > limit else None
     pledges = []
-    async for pledge in cursor:
+    for pledge in docs[:limit]:
+        pledge["id"] = str(pledge.pop("_id"))
         pledges.append(pledge)
 
-    return pledges
+    return pledges, next_cursor
+
 
+async def like_pledge_by_id(pledge_id: str) -> Optional[int]:
+    """Like a pledge by id. Returns its new like count, or None if it doesn't exist."""
+    try:
+        oid = ObjectId(pledge_id)
+    except InvalidId:
+        return None
+    pledge = await db.pledges.find_one_and_update(
+        {"_id": oid},
+        {"$inc": {"likes": 1}},
+        projection={"likes": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    return pledge["likes"] if pledge else None
 
-async def like_pledge(username: str, pledge_created_at: datetime) -> bool:
-    """Like a pledge."""
-    result = await db.pledges.update_one(
-        {"username": username, "created_at": pledge_created_at},
-        {"$inc": {"likes": 1}}
+
+# ── EcoChat Sessions ────────────────────────────────────────────
+
+async def load_chat_session(session_id: str) -> Optional[list[dict]]:
+    """Get a persisted chat session's turns, or None if it doesn't exist."""
+    doc = await db.chat_sessions.find_one({"_id": session_id}, {"turns": 1})
+    return doc.get("turns", []) if doc else None
+
+
+async def append_chat_turns(session_id: str, turns: list[dict], max_turns: int):
+    """Append turns to a persisted session, keeping only the newest max_turns."""
+    await db.chat_sessions.update_one(
+        {"_id": session_id},
+        {
+            "$push": {"turns": {"$each": turns, "$slice": -max_turns}},
+            "$set": {"updated_at": datetime.now(timezone.utc)},
+        },
+        upsert=True,
     )
-    return result.modified_count > 0
+
+
+# ── Daily Tip ───────────────────────────────────────────────────
+
+async def save_daily_tip(day: str, text: str, audio: bytes) -> dict:
+    """
+    Store the tip for `day` (YYYY-MM-DD). If another worker already stored
+    one for that day, theirs wins and is returned.
+    """
+    tip = {"_id": day, "text": text, "audio": audio, "created_at": datetime.now(timezone.utc)}
+    try:
+        await db.daily_tips.insert_one(tip)
+    except DuplicateKeyError:
+        tip = await db.daily_tips.find_one({"_id": day})
+    return tip
+
+
+async def get_latest_daily_tip() -> Optional[dict]:
+    """Get the most recent stored tip (today's, or the previous fallback)."""
+    return await db.daily_tips.find_one({}, sort=[("_id", -1)])
 
 
 # ── Stats ───────────────────────────────────────────────────────
 
-async def get_global_stats() -> dict:
-    """Get global GreenMason statistics."""
+def _breakdown_key(action: str) -> str:
+    """Action names become field names in the counters document."""
+    return action.replace(".", "_").lstrip("$") or "unknown"
+
+
+async def increment_counters(users: int = 0, actions: dict = None, points: int = 0, pledges: int = 0):
+    """
+    Atomically bump the global counters. `actions` maps action type ->
+    count; total_actions goes up by their sum.
+    """
+    inc = {}
+    if users:
+        inc["total_users"] = users
+    if pledges:
+        inc["total_pledges"] = pledges
+    if points:
+        inc["total_points"] = points
+    for action, count in (actions or {}).items():
+        inc[f"action_breakdown.{_breakdown_key(action)}"] = count
+        inc["total_actions"] = inc.get("total_actions", 0) + count
+    if inc:
+        await db.counters.update_one({"_id": COUNTERS_ID}, {"$inc": inc}, upsert=True)
+
+
+async def rebuild_counters() -> dict:
+    """
+    Recompute the counters from the raw collections (full scans). Writes
+    landing while this runs can be missed, so run it when traffic is low.
+    """
     total_users = await db.users.count_documents({})
     total_actions = await db.actions.count_documents({})
     total_pledges = await db.pledges.count_documents({})
@@ -228,12 +536,30 @@ async def get_global_stats() -> dict:
     ]
     action_breakdown = {}
     async for doc in db.actions.aggregate(action_pipeline):
-        action_breakdown[doc["_id"]] = doc["count"]
+        key = _breakdown_key(str(doc["_id"]))
+        action_breakdown[key] = action_breakdown.get(key, 0) + doc["count"]
 
-    return {
+    counters = {
         "total_users": total_users,
         "total_actions": total_actions,
         "total_pledges": total_pledges,
         "total_points": total_points,
         "action_breakdown": action_breakdown,
-    }
\ No newline at end of file
+    }
+    await db.counters.replace_one({"_id": COUNTERS_ID}, counters, upsert=True)
+    return counters
+
+
+async def get_global_stats() -> dict:
+    """Get global GreenMason statistics (one point read of the counters)."""
+    counters = await db.counters.find_one({"_id": COUNTERS_ID})
+    if counters is None:
+        return await rebuild_counters()
+
+    return {
+        "total_users": counters.get("total_users", 0),
+        "total_actions": counters.get("total_actions", 0),
+        "total_pledges": counters.get("total_pledges", 0),
+        "total_points": counters.get("total_points", 0),
+        "action_breakdown": counters.get("action_breakdown", {}),
+    }
@@ -88,6 +88,75 @@ AGENTS = {
 }
 
 
+# ── Keyword Matcher ─────────────────────────────────────────────
+#
+# The keyword tables are compiled once at import. A message is split into
+# words in one pass over its UTF-8 bytes (bytes.translate + split, both in
+# C and far cheaper than str.translate's per-character dict lookups), and
+# the matcher works on those byte words directly. Each distinct word is
+# looked up once in a single table, which gives the one-word keywords it
+# matches and the multi-word keywords it starts; those phrases are only
+# looked for when the message contains their first word. Keywords match
+# whole words only (so "eat" no longer fires on "great"), with plural and
+# possessive endings ("exams", "dorm's") still counting.
+
+# Everything but ASCII letters and digits separates words ("ike's" -> "ike s");
+# non-ASCII bytes stay inside their word
+_SEPARATORS = bytes(b if b >= 128 or chr(b).isalnum() else 32 for b in range(256))
+_SUFFIXES = (b"", b"s", b"es")
+
+
+def _split_bytes(text: str) -> list[bytes]:
+    return text.lower().replace("\u2019", " ").encode("utf-8").translate(_SEPARATORS).split()
+
+
+def split_words(text: str) -> list[str]:
+    """Lowercased words, as the keyword matcher (and intent model) see them."""
+    return [word.decode("utf-8") for word in _split_bytes(text)]
+
+
+def _build_matcher():
+    owners: dict[str, list[tuple[str, int]]] = {}
+    for agent_key, agent in AGENTS.items():
+        for position, keyword in enumerate(agent["keywords"]):
+            owners.setdefault(keyword, []).append((agent_key, position))
+
+    # word -> (one-word keywords it is a form of, [(b" phrase form ", keyword)] it starts)
+    table: dict[bytes, tuple[list[str], list[tuple[bytes, str]]]] = {}
+    for keyword in owners:
+        tokens = _split_bytes(keyword)
+        for suffix in _SUFFIXES:
+            form = tokens[:-1] + [tokens[-1] + suffix]
+            if len(tokens) == 1:
+                table.setdefault(form[0], ([], []))[0].append(keyword)
+            else:
+                table.setdefault(tokens[0], ([], []))[1].append((b" " + b" ".join(form) + b" ", keyword))
+    return owners, table
+
+
+_KEYWORD_OWNERS, _KEYWORD_TABLE = _build_matcher()
+
+
+def _find_keywords(message: str) -> set[str]:
+    tokens = _split_bytes(message)
+    found = set()
+    text = None
+    # One dict lookup per distinct word (a set & dict.keys() would walk every keyword)
+    for word in set(tokens):
+        entry = _KEYWORD_TABLE.get(word)
+        if entry is None:
+            continue
+        keywords, phrases = entry
+        found.update(keywords)
+        if phrases:
+            if text is None:
+                text = b" " + b" ".join(tokens) + b" "
+            for form, keyword in phrases:
+                if form in text:
+                    found.add(keyword)
+    return found
+
+
 def detect_patriotai_route(message: str) -> dict | None:
     """
     Analyze a user message and determine if it should be routed
@@ -99,40 +168,42 @@ def detect_patriotai_route(message: str) -> dict | None:
     Returns:
         dict with agent info if routing is needed, None otherwise
     """
-    message_lower = message.lower()
+    found = _find_keywords(message)
+    if not found:
+        return None
 
     # Score each agent based on keyword matches
     scores = {}
-    for agent_key, agent in AGENTS.items():
-        score = 0
-        matched_keywords = []
-        for keyword in agent["keywords"]:
-            if keyword in message_lower:
-                score += len(keyword)  # Longer keyword matches are more specific
-                matched_keywords.append(keyword)
-        if score > 0:
-            scores[agent_key] = {"score": score, "keywords": matched_keywords}
-
-    if not scores:
-        return None
+    for keyword in found:
+        for agent_key, position in _KEYWORD_OWNERS[keyword]:
+            info = scores.setdefault(agent_key, {"score": 0, "keywords": []})
+            info["score"] += len(keyword)  # Longer keyword matches are more specific
+            info["keywords"].append((position, keyword))
 
-    # Get the best matching agent
-    best_agent_key = max(scores, key=lambda k: scores[k]["score"])
-    best_agent = AGENTS[best_agent_key]
+    # Get the best matching agent (ties go to the first agent, as before)
+    best_agent_key = max(
+        (key for key in AGENTS if key in scores), key=lambda k: scores[k]["score"]
+    )
 
     # Only route if we have a meaningful match (at least one multi-word keyword or 2+ single keywords)
     match_info = scores[best_agent_key]
     if match_info["score"] < 4:  # Minimum threshold
         return None
 
+    return agent_route(best_agent_key, [keyword for _, keyword in sorted(match_info["keywords"])])
+
+
+def agent_route(agent_key: str, matched_keywords: list[str] = None) -> dict:
+    """Routing info for sending a message to `agent_key`."""
+    agent = AGENTS[agent_key]
     return {
-        "agent_key": best_agent_key,
-        "agent_name": best_agent["name"],
-        "agent_emoji": best_agent["emoji"],
-        "agent_description": best_agent["description"],
-        "agent_url": best_agent["url"],
-        "matched_keywords": match_info["keywords"],
-        "example_queries": best_agent["example_queries"],
+        "agent_key": agent_key,
+        "agent_name": agent["name"],
+        "agent_emoji": agent["emoji"],
+        "agent_description": agent["description"],
+        "agent_url": agent["url"],
+        "matched_keywords": matched_keywords or [],
+        "example_queries": agent["example_queries"],
     }
 
 
@@ -0,0 +1,271 @@
+"""In-process rank index for the Green Score leaderboard.
+
+Ranking with count_documents({"total_score": {"$gt": score}}) is a range
+count that grows with the user base. Instead, every worker keeps a
+Fenwick tree over score values (count of users per score) plus the set of
+users at each score, built from the users collection at startup:
+
+- rank(score): users with a higher score + 1, one prefix sum, O(log S)
+- top(k): walk the distinct scores downward with order-statistic
+  selects, O(distinct scores in the top k * log S)
+
+Score changes are applied as they happen (record()), and the
+index is reconciled against MongoDB every RANK_INDEX_RECONCILE_SECONDS to
+pick up writes from other workers. Users updated locally in the last
+RANK_INDEX_GRACE_SECONDS keep their local value, since their newest
+points may not be in the snapshot yet. Negative totals share the 0 bucket
+and totals from RANK_INDEX_MAX_SCORE up share the top one, which keeps
+the tree's memory bounded.
+"""
+
+import os
+import time
+import asyncio
+from typing import Optional
+
+from services import mongodb
+
+RANK_INDEX_RECONCILE_SECONDS = float(os.getenv("RANK_INDEX_RECONCILE_SECONDS", "300"))
+RANK_INDEX_GRACE_SECONDS = float(os.getenv("RANK_INDEX_GRACE_SECONDS", "30"))
+# Scores at or above this share the top bucket and are ranked by MongoDB
+RANK_INDEX_MAX_SCORE = int(os.getenv("RANK_INDEX_MAX_SCORE", "1000000"))
+
+
+class FenwickTree:
+    """Counts per integer value in [0, size), with prefix sums and selects."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self.total = 0
+        self._tree = [0] * (size + 1)
+
+    def add(self, value: int, delta: int):
+        self.total += delta
+        i = value + 1
+        while i <= self.size:
+            self._tree[i] += delta
+            i += i & -i
+
+    def prefix(self, value: int) -> int:
+        """How many entries are <= value."""
+        i = min(value + 1, self.size)
+        count = 0
+        while i > 0:
+            count += self._tree[i]
+            i -= i & -i
+        return count
+
+    def select(self, k: int) -> int:
+        """The k-th smallest value (1-based)."""
+        pos = 0
+        step = 1 << self.size.bit_length()
+        while step:
+            nxt = pos + step
+            if nxt <= self.size and self._tree[nxt] < k:
+                pos = nxt
+                k -= self._tree[nxt]
+            step >>= 1
+        return pos  # 0-based value
+
+
+_tree = FenwickTree(1024)
+_buckets: dict[int, set[str]] = {}
+_users: dict[str, dict] = {}  # username -> {"score", "display_name", "actions_count", "updated_at"}
+_ready = False
+_task: Optional[asyncio.Task] = None
+_stats = {"rebuilds": 0, "reconciles": 0, "corrections": 0, "fallbacks": 0}
+
+
+def _bucket(score: int) -> int:
+    return min(max(0, score), RANK_INDEX_MAX_SCORE)
+
+
+def _grow(score: int):
+    """Re-create the tree with room for `score` (capacity doubles)."""
+    global _tree
+    size = _tree.size
+    while score >= size:
+        size *= 2
+    tree = FenwickTree(size)
+    for value, usernames in _buckets.items():
+        tree.add(value, len(usernames))
+    _tree = tree
+
+
+def _place(username: str, score: int):
+    value = _bucket(score)
+    if value >= _tree.size:
+        _grow(value)
+    _tree.add(value, 1)
+    _buckets.setdefault(value, set()).add(username)
+
+
+def _unplace(username: str, score: int):
+    value = _bucket(score)
+    _tree.add(value, -1)
+    bucket = _buckets[value]
+    bucket.discard(username)
+    if not bucket:
+        del _buckets[value]
+
+
+def _set(username: str, score: int, display_name: str = None, actions_count: int = None, updated_at: float = 0.0):
+    entry = _users.get(username)
+    if entry is None:
+        entry = _users[username] = {
+            "score": score,
+            "display_name": display_name or username,
+            "actions_count": actions_count or 0,
+            "updated_at": updated_at,
+        }
+        _place(username, score)
+        return
+
+    if entry["score"] != score:
+        _unplace(username, entry["score"])
+        _place(username, score)
+        entry["score"] = score
+    if display_name:
+        entry["display_name"] = display_name
+    if actions_count is not None:
+        entry["actions_count"] = actions_count
+    entry["updated_at"] = updated_at
+
+
+def record(username: str, total_score: int, actions: int = 1, display_name: str = None):
+    """Apply a new total written (or buffered) by this worker."""
+    entry = _users.get(username)
+    count = (entry["actions_count"] if entry else 0) + actions
+    _set(username, total_score, display_name, count, time.monotonic())
+
+
+def ensure_user(username: str, display_name: str = None):
+    """Register a user (created with 0 points) if the index doesn't know them."""
+    if username not in _users:
+        _set(username, 0, display_name, 0, time.monotonic())
+
+
+def rank(score: int) -> int:
+    """1 + the number of users with a strictly higher score."""
+    return _tree.total - _tree.prefix(_bucket(score)) + 1
+
+
+async def get_user_rank(username: str, score: int = None) -> int:
+    """
+    A user's leaderboard rank, from the index once it's built. A `score`
+    just read from MongoDB is used (and the index caught up to it) unless
+    this worker changed the user's score within the grace window, in which
+    case its own, possibly unflushed, total is newer.
+    """
+    if _ready:
+        entry = _users.get(username)
+        if score is None:
+            score = entry["score"] if entry else None
+        elif entry is None or entry["updated_at"] <= time.monotonic() - RANK_INDEX_GRACE_SECONDS:
+            _set(username, score, updated_at=entry["updated_at"] if entry else 0.0)
+        else:
+            score = entry["score"]
+        if score is not None and score < RANK_INDEX_MAX_SCORE:
+            return rank(score)
+    _stats["fallbacks"] += 1
+    return await mongodb.get_user_rank(username, score)
+
+
+def top(limit: int) -> list[dict]:
+    """The top `limit` users with a positive score, leaderboard-shaped."""
+    leaderboard = []
+    remaining = _tree.total
+    while remaining > 0 and len(leaderboard) < limit:
+        value = _tree.select(remaining)
+        if value <= 0:
+            break
+        usernames = _buckets[value]
+        for username in sorted(usernames, key=lambda u: (-_users[u]["score"], u)):
+            if len(leaderboard) >= limit:
+                break
+            entry = _users[username]
+            leaderboard.append({
+                "rank": len(leaderboard) + 1,
+                "username": username,
+                "display_name": entry["display_name"],
+                "total_score": entry["score"],
+                "actions_count": entry["actions_count"],
+            })
+        remaining -= len(usernames)
+    return leaderboard
+
+
+async def get_leaderboard(limit: int = 20) -> list[dict]:
+    if _ready:
+        return top(limit)
+    _stats["fallbacks"] += 1
+    return await mongodb.get_leaderboard(limit)
+
+
+async def refresh():
+    """Build the index from MongoDB, or reconcile it with a fresh snapshot."""
+    global _ready
+    started = time.monotonic()
+    users = await mongodb.get_rank_entries()
+
+    if not _ready:
+        for user in users:
+            _set(user["username"], user.get("total_score", 0), user.get("display_name"), user.get("actions_count", 0))
+        _ready = True
+        _stats["rebuilds"] += 1
+        print(f"🏆 Rank index built ({len(users)} users)")
+        return
+
+    cutoff = started - RANK_INDEX_GRACE_SECONDS
+    for user in users:
+        entry = _users.get(user["username"])
+        if entry and entry["updated_at"] > cutoff:
+            continue
+        score = user.get("total_score", 0)
+        if entry is None or entry["score"] != score:
+            _stats["corrections"] += 1
+        _set(user["username"], score, user.get("display_name"), user.get("actions_count", 0))
+    _stats["reconciles"] += 1
+
+
+async def _run():
+    while True:
+        await asyncio.sleep(RANK_INDEX_RECONCILE_SECONDS)
+        try:
+            await refresh()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Rank index reconcile failed: {e}")
+
+
+async def start():
+    """Build the index and schedule reconciliation (called from the lifespan hook)."""
+    global _task
+    try:
+        await refresh()
+    except Exception as e:
+        print(f"⚠️ Rank index build failed, ranking from MongoDB: {e}")
+    if _task is None:
+        _task = asyncio.create_task(_run())
+
+
+async def stop():
+    global _task
+    if _task:
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+        _task = None
+
+
+def stats() -> dict:
+    return {
+        "ready": _ready,
+        "users": len(_users),
+        "distinct_scores": len(_buckets),
+        "capacity": _tree.size,
+        **_stats,
+    }
@@ -0,0 +1,62 @@
+"""Read-through caches for the dashboard's shared reads.
+
+Every dashboard load asks for the leaderboard, the global stats and the
+pledge wall, which change a few times a second at most. Each is cached
+for a few seconds with single-flight loading, and carries an ETag so
+clients can revalidate with If-None-Match. Score and pledge writes
+invalidate the affected caches right away.
+"""
+
+import os
+
+from services import mongodb, rank_index
+from services.cache import ReadThroughCache
+
+LEADERBOARD_CACHE_TTL_SECONDS = float(os.getenv("LEADERBOARD_CACHE_TTL_SECONDS", "2"))
+STATS_CACHE_TTL_SECONDS = float(os.getenv("STATS_CACHE_TTL_SECONDS", "10"))
+PLEDGES_CACHE_TTL_SECONDS = float(os.getenv("PLEDGES_CACHE_TTL_SECONDS", "5"))
+
+_leaderboard = ReadThroughCache(LEADERBOARD_CACHE_TTL_SECONDS)
+_stats = ReadThroughCache(STATS_CACHE_TTL_SECONDS)
+_pledges = ReadThroughCache(PLEDGES_CACHE_TTL_SECONDS)
+
+
+async def get_leaderboard(limit: int) -> tuple[list[dict], str]:
+    return await _leaderboard.get(limit, lambda: rank_index.get_leaderboard(limit))
+
+
+async def get_window_leaderboard(window: str, limit: int) -> tuple[dict, str]:
+    """({"since", "leaderboard"}, etag) for a day/week/month/semester leaderboard."""
+    async def load() -> dict:
+        since = mongodb.window_start(window)
+        return {"since": since, "leaderboard": await mongodb.get_window_leaderboard(window, limit)}
+
+    return await _leaderboard.get((window, limit), load)
+
+
+async def get_global_stats() -> tuple[dict, str]:
+    return await _stats.get("global", mongodb.get_global_stats)
+
+
+async def get_pledges(limit: int, cursor: str = None) -> tuple[tuple[list[dict], str], str]:
+    """((pledges, next_cursor), etag) for one page of the pledge wall."""
+    return await _pledges.get((limit, cursor), lambda: mongodb.get_pledges(limit, cursor))
+
+
+def invalidate_scores():
+    """After points change: the leaderboard and the totals in the stats."""
+    _leaderboard.invalidate()
+    _stats.invalidate()
+
+
+def invalidate_pledges():
+    """After a pledge or a like (likes change no stats; a new pledge's go with invalidate_scores())."""
+    _pledges.invalidate()
+
+
+def stats() -> dict:
+    return {
+        "leaderboard": _leaderboard.stats(),
+        "global_stats": _stats.stats(),
+        "pledges": _pledges.stats(),
+    }
@@ -0,0 +1,155 @@
+"""Score summary audio spliced from pre-rendered clips.
+
+Every score summary is the same sentence with a different name, score
+and rank, so instead of synthesizing it per request it is assembled from
+segments:
+
+    "Hey {name}!" | "Your Green Score is" | <score> | "points, and you're
+    ranked number" | <rank> | "on the campus leaderboard. ..."
+
+The fixed phrases and a library of number clips (0-99 plus "hundred",
+"thousand", "million") are synthesized the first time a summary needs
+them and kept in the on-disk audio cache; only the greeting is new per
+display name. The MP3 segments are then joined locally, so once its
+clips are cached a summary needs no upstream call at all.
+
+Rendering the whole library up front is ~100 paid synthesis calls, so
+warm_up() only runs at startup with SCORE_AUDIO_WARM_UP=1, which is
+worth it only when TTS_CACHE_DIR is on a persistent disk.
+"""
+
+import os
+import asyncio
+import hashlib
+from typing import Optional
+
+from services import elevenlabs
+
+SCORE_AUDIO_WARM_UP = os.getenv("SCORE_AUDIO_WARM_UP", "") == "1"
+
+# Longest display name read out (matches UserCreate.display_name)
+MAX_NAME_CHARS = 50
+
+SCORE_PHRASES = [
+    "Your Green Score is",
+    "points, and you're ranked number",
+    "on the campus leaderboard. Keep making sustainable choices — every action counts! Happy Green Day.",
+]
+
+_ONES = [
+    "zero", "one", "two", "three", "four", "five", "six", "seven", "eight", "nine",
+    "ten", "eleven", "twelve", "thirteen", "fourteen", "fifteen", "sixteen",
+    "seventeen", "eighteen", "nineteen",
+]
+_TENS = ["", "", "twenty", "thirty", "forty", "fifty", "sixty", "seventy", "eighty", "ninety"]
+_SCALES = [(1_000_000, "million"), (1_000, "thousand")]
+
+_warm_task: Optional[asyncio.Task] = None
+_warm = False
+
+
+def _below_hundred(n: int) -> str:
+    if n < 20:
+        return _ONES[n]
+    tens, ones = divmod(n, 10)
+    return _TENS[tens] + (f"-{_ONES[ones]}" if ones else "")
+
+
+def _below_thousand(n: int) -> list[str]:
+    hundreds, rest = divmod(n, 100)
+    words = [_below_hundred(hundreds), "hundred"] if hundreds else []
+    if rest or not words:
+        words.append(_below_hundred(rest))
+    return words
+
+
+def number_clips(n: int) -> list[str]:
+    """The number clips that spell out n, e.g. 1203 -> one, thousand, two, hundred, three."""
+    if n < 0:
+        return ["minus"] + number_clips(-n)
+    if n >= 1_000_000_000:
+        return [str(n)]  # rare enough to synthesize as a one-off clip
+
+    clips = []
+    for scale, word in _SCALES:
+        count, n = divmod(n, scale)
+        if count:
+            clips += _below_thousand(count) + [word]
+    if n or not clips:
+        clips += _below_thousand(n)
+    return clips
+
+
+def library() -> list[str]:
+    """Every shared clip: the fixed phrases and the number words."""
+    return (
+        SCORE_PHRASES
+        + [_below_hundred(n) for n in range(100)]
+        + ["hundred", "minus"]
+        + [word for _, word in _SCALES]
+    )
+
+
+def segments(display_name: str, score: int, rank: int) -> list[str]:
+    """The clip texts that make up one score summary, in order."""
+    # Names stored before the schema limit, or taken from a /api/scores
+    # username, can be any length
+    name = display_name[:MAX_NAME_CHARS].strip()
+    return (
+        [f"Hey {name}!", SCORE_PHRASES[0]]
+        + number_clips(score)
+        + [SCORE_PHRASES[1]]
+        + number_clips(rank)
+        + [SCORE_PHRASES[2]]
+    )
+
+
+def summary_etag(display_name: str, score: int, rank: int) -> str:
+    """ETag for a summary, derived from its segments' content keys."""
+    keys = "".join(elevenlabs.speech_key(text) for text in segments(display_name, score, rank))
+    return f'"score-{hashlib.sha256(keys.encode("ascii")).hexdigest()[:32]}"'
+
+
+async def render(display_name: str, score: int, rank: int) -> bytes:
+    """Splice a score summary from cached clips (synthesizing any that are missing)."""
+    clips = await asyncio.gather(
+        *(elevenlabs.text_to_speech(text) for text in segments(display_name, score, rank))
+    )
+    return elevenlabs.join_mp3(clips)
+
+
+async def warm_up():
+    """Render the shared clip library into the audio cache."""
+    global _warm
+    results = await asyncio.gather(
+        *(elevenlabs.text_to_speech(text) for text in library()),
+        return_exceptions=True,
+    )
+    failed = [r for r in results if isinstance(r, Exception)]
+    if failed:
+        print(f"⚠️ Score audio warm-up: {len(failed)} clips failed ({failed[0]}), they'll render on demand")
+    else:
+        _warm = True
+        print(f"🔊 Score audio clips ready ({len(results)} clips)")
+
+
+def start():
+    """Warm up the clip library in the background if SCORE_AUDIO_WARM_UP is on (called from the lifespan hook)."""
+    global _warm_task
+    if SCORE_AUDIO_WARM_UP and _warm_task is None:
+        _warm_task = asyncio.create_task(warm_up())
+
+
+async def stop():
+    global _warm_task
+    if _warm_task:
+        _warm_task.cancel()
+        try:
+            await _warm_task
+        except asyncio.CancelledError:
+            pass
+        _warm_task = None
+
+
+def stats() -> dict:
+    return {"library_clips": len(library()), "warm_up": SCORE_AUDIO_WARM_UP, "warm": _warm}
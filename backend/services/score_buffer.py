@@ -0,0 +1,293 @@
+"""Write-behind buffering for score actions (opt-in).
+
+With SCORE_WRITE_BEHIND=1, /api/scores doesn't write to MongoDB on the
+request path. Action documents go into a bounded in-memory queue and
+per-user increments are collapsed; a background flusher writes them with
+one insert_many plus one bulk_write of $inc upserts, whenever
+SCORE_FLUSH_MAX_ACTIONS have queued or every SCORE_FLUSH_INTERVAL_SECONDS.
+A full queue makes log_action wait (backpressure) instead of growing
+without bound, and the lifespan hook flushes whatever is left on shutdown.
+
+new_total stays exact per worker: a user's stored total is read at most
+once a minute (under the flush lock, so it's consistent with the
+unflushed increments) and kept up to date in memory in between.
+Leaderboards and profiles see the points once the next flush lands.
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from services import mongodb, rank_index, read_cache
+from services.cache import TTLCache
+
+SCORE_WRITE_BEHIND = os.getenv("SCORE_WRITE_BEHIND", "") == "1"
+SCORE_QUEUE_MAX = int(os.getenv("SCORE_QUEUE_MAX", "10000"))
+SCORE_FLUSH_MAX_ACTIONS = int(os.getenv("SCORE_FLUSH_MAX_ACTIONS", "500"))
+SCORE_FLUSH_INTERVAL_SECONDS = float(os.getenv("SCORE_FLUSH_INTERVAL_SECONDS", "0.5"))
+
+_queue: Optional[asyncio.Queue] = None
+_flush_now = asyncio.Event()
+_flush_lock = asyncio.Lock()
+_task: Optional[asyncio.Task] = None
+
+# username -> {"points", "actions", "first_at", "last_at"} not yet in MongoDB
+_pending: dict[str, dict] = {}
+# Action documents whose insert failed, retried on the next flush
+_retry_docs: list[dict] = []
+# username -> {"total"}: running total as this worker knows it
+_totals = TTLCache(10000, 60)
+
+_flush_ms = deque(maxlen=200)
+_stats = {
+    "queued": 0,
+    "flushes": 0,
+    "actions_flushed": 0,
+    "users_flushed": 0,
+    "last_flush_actions": 0,
+    "backpressure_waits": 0,
+    "flush_errors": 0,
+}
+
+
+async def _load_total(username: str) -> int:
+    """Stored total plus everything this worker hasn't flushed yet."""
+    async with _flush_lock:
+        user = await mongodb.get_user(username)
+        stored = user["total_score"] if user else 0
+        total = stored + _pending.get(username, {}).get("points", 0)
+        # Mutated in place from here on, so the entry still expires (and
+        # picks up other workers' points) TTL seconds after this read
+        _totals.set(username, {"total": total})
+    return total
+
+
+async def log_action(username: str, action: str, points: int, description: str = None) -> dict:
+    """
+    Same contract as mongodb.log_action. Writes through directly unless
+    write-behind is enabled and running.
+    """
+    if _queue is None:
+        result = await mongodb.log_action(username, action, points, description)
+        rank_index.record(username, result["new_total"])
+        read_cache.invalidate_scores()
+        return result
+
+    now = datetime.now(timezone.utc)
+    doc = {
+        "_id": ObjectId(),  # fixed up front so a retried insert can't duplicate
+        "username": username,
+        "action": action,
+        "points": points,
+        "description": description,
+        "created_at": now,
+    }
+    if _queue.full():
+        _stats["backpressure_waits"] += 1
+    await _queue.put(doc)
+    _stats["queued"] += 1
+    if _queue.qsize() >= SCORE_FLUSH_MAX_ACTIONS:
+        _flush_now.set()
+
+    entry = _pending.setdefault(username, {"points": 0, "actions": 0, "first_at": now, "last_at": now})
+    entry["points"] += points
+    entry["actions"] += 1
+    entry["last_at"] = now
+
+    known = _totals.get(username)
+    if known is not None:
+        known["total"] += points
+        new_total = known["total"]
+    else:
+        new_total = await _load_total(username)
+    rank_index.record(username, new_total)
+    read_cache.invalidate_scores()
+
+    return {
+        "username": username,
+        "points_added": points,
+        "new_total": new_total,
+        "action": action,
+    }
+
+
+def _user_update(username: str, entry: dict) -> UpdateOne:
+    return UpdateOne(
+        {"username": username},
+        {
+            "$inc": {"total_score": entry["points"], "actions_count": entry["actions"]},
+            "$set": {"last_active": entry["last_at"]},
+            "$setOnInsert": {"display_name": username, "created_at": entry["first_at"]},
+        },
+        upsert=True,
+    )
+
+
+async def flush() -> int:
+    """Write everything queued so far. Returns the number of actions written."""
+    global _retry_docs
+    async with _flush_lock:
+        docs, _retry_docs = _retry_docs, []
+        while not _queue.empty() and len(docs) < SCORE_FLUSH_MAX_ACTIONS * 2:
+            docs.append(_queue.get_nowait())
+        batch = {username: dict(entry) for username, entry in _pending.items()}
+        if not docs and not batch:
+            return 0
+
+        started = time.perf_counter()
+        usernames = list(batch)
+        inserted, updated = await asyncio.gather(
+            _insert_actions(docs),
+            mongodb.db.users.bulk_write([_user_update(u, batch[u]) for u in usernames], ordered=False)
+            if usernames else _noop(),
+            return_exceptions=True,
+        )
+
+        if isinstance(inserted, Exception):
+            _stats["flush_errors"] += 1
+            _retry_docs = docs
+            print(f"⚠️ Score flush: action insert failed, will retry: {inserted}")
+
+        failed = set()
+        if isinstance(updated, BulkWriteError):
+            failed = {usernames[e["index"]] for e in updated.details.get("writeErrors", [])}
+        elif isinstance(updated, Exception):
+            failed = set(usernames)
+        if failed:
+            _stats["flush_errors"] += 1
+            print(f"⚠️ Score flush: {len(failed)} user updates failed, will retry")
+
+        # Only what was written leaves _pending; anything added meanwhile stays
+        for username in usernames:
+            if username in failed:
+                continue
+            entry = _pending[username]
+            entry["points"] -= batch[username]["points"]
+            entry["actions"] -= batch[username]["actions"]
+            if entry["actions"] <= 0:
+                del _pending[username]
+
+        written = 0 if isinstance(inserted, Exception) else len(docs)
+        await _count(docs if written else [], batch, usernames, failed, updated)
+        _flush_ms.append((time.perf_counter() - started) * 1000)
+        _stats["flushes"] += 1
+        _stats["actions_flushed"] += written
+        _stats["users_flushed"] += len(usernames) - len(failed)
+        _stats["last_flush_actions"] = written
+        if usernames:
+            read_cache.invalidate_scores()  # stored totals moved
+        return written
+
+
+async def _count(docs: list[dict], batch: dict, usernames: list[str], failed: set, updated):
+    """Move the global counters and daily rollups by what this flush actually wrote."""
+    actions = {}
+    for doc in docs:
+        actions[doc["action"]] = actions.get(doc["action"], 0) + 1
+    points = sum(batch[u]["points"] for u in usernames if u not in failed)
+    if isinstance(updated, BulkWriteError):
+        new_users = updated.details.get("nUpserted", 0)
+    elif isinstance(updated, Exception) or updated is None:
+        new_users = 0
+    else:
+        new_users = updated.upserted_count
+    rollups = [(doc["username"], doc["created_at"], doc["points"], 1) for doc in docs]
+    counted = await asyncio.gather(
+        mongodb.increment_counters(users=new_users, actions=actions, points=points),
+        mongodb.increment_rollups(rollups),
+        return_exceptions=True,
+    )
+    for result in counted:
+        if isinstance(result, Exception):
+            _stats["flush_errors"] += 1
+            print(f"⚠️ Score flush: counter update failed: {result}")
+
+
+async def _insert_actions(docs: list[dict]):
+    if not docs:
+        return None
+    try:
+        return await mongodb.db.actions.insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        # Documents that already made it in on an earlier attempt
+        if all(err.get("code") == 11000 for err in e.details.get("writeErrors", [])):
+            return None
+        raise
+
+
+async def _noop():
+    return None
+
+
+async def _run():
+    while True:
+        try:
+            await asyncio.wait_for(_flush_now.wait(), SCORE_FLUSH_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _flush_now.clear()
+        try:
+            await flush()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _stats["flush_errors"] += 1
+            print(f"⚠️ Score flush failed: {e}")
+        if _queue.qsize() >= SCORE_FLUSH_MAX_ACTIONS:
+            _flush_now.set()
+
+
+def start():
+    """Start the flusher if SCORE_WRITE_BEHIND is on (called from the lifespan hook)."""
+    global _queue, _task
+    if not SCORE_WRITE_BEHIND or _task is not None:
+        return
+    _queue = asyncio.Queue(maxsize=SCORE_QUEUE_MAX)
+    _task = asyncio.create_task(_run())
+    print(f"📝 Score write-behind on (flush every {SCORE_FLUSH_INTERVAL_SECONDS}s or {SCORE_FLUSH_MAX_ACTIONS} actions)")
+
+
+async def stop():
+    """Stop the flusher and write out everything still buffered."""
+    global _queue, _task
+    if _task is None:
+        return
+    errors = _stats["flush_errors"]
+    async with _flush_lock:
+        _task.cancel()  # never mid-flush, or the drained batch would be lost
+    try:
+        await _task
+    except asyncio.CancelledError:
+        pass
+    _task = None
+
+    while not _queue.empty() or _pending or _retry_docs:
+        try:
+            await flush()
+        except Exception as e:
+            print(f"⚠️ Score flush failed on shutdown: {e}")
+            break
+        if _retry_docs or _stats["flush_errors"] > errors:
+            break  # MongoDB is refusing writes; don't spin
+    if not _queue.empty() or _pending or _retry_docs:
+        print(f"⚠️ {_queue.qsize() + len(_retry_docs)} score actions could not be flushed")
+    _queue = None
+
+
+def stats() -> dict:
+    return {
+        "enabled": SCORE_WRITE_BEHIND,
+        **_stats,
+        "queue_depth": _queue.qsize() if _queue else 0,
+        "queue_max": SCORE_QUEUE_MAX,
+        "pending_users": len(_pending),
+        "avg_flush_ms": round(sum(_flush_ms) / len(_flush_ms), 2) if _flush_ms else 0.0,
+        "max_flush_ms": round(max(_flush_ms), 2) if _flush_ms else 0.0,
+    }
@@ -44,6 +44,7 @@ export default function ChatPage() {
   const [messages, setMessages] = useState<DisplayMessage[]>([]);
   const [input, setInput] = useState("");
   const [isLoading, setIsLoading] = useState(false);
+  const sessionIdRef = useRef<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const inputRef = useRef<HTMLInputElement>(null);
 
@@ -61,13 +62,15 @@ export default function ChatPage() {
     setIsLoading(true);
 
     try {
-      // Build history for context
+      // The server keeps the conversation; history is only sent to seed a
+      // new session (first message, or after the server lost ours)
       const history: ChatMessage[] = messages.map((m) => ({
         role: m.role,
         content: m.content,
       }));
 
-      const response: ChatResponse = await sendChatMessage(text.trim(), history);
+      const response: ChatResponse = await sendChatMessage(text.trim(), history, sessionIdRef.current);
+      sessionIdRef.current = response.session_id ?? null;
 
       const assistantMsg: DisplayMessage = {
         role: "assistant",
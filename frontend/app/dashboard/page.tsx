@@ -5,11 +5,13 @@ import Image from "next/image";
 import { Trophy, Heart, Flame, Star, Send, Crown, Medal, Award, Loader2, Volume2 } from "lucide-react";
 import { useUser } from "@/lib/user-context";
 import {
+  getDashboard,
   getLeaderboard,
   getPledges,
   createPledge,
   logScore,
   getScoreSummaryAudioUrl,
+  type Dashboard,
   type LeaderboardEntry,
   type Pledge,
 } from "@/lib/api";
@@ -31,22 +33,10 @@ function getSproutStage(score: number) {
   return { label: "Fresh Sprout 🫛", image: "/sprout/sprout-wave.png", level: 1 };
 }
 
-// Achievement badges
-function getAchievements(score: number, actions: number) {
-  const badges = [];
-  if (actions >= 1) badges.push({ emoji: "🌱", name: "First Date with Recycling" });
-  if (actions >= 5) badges.push({ emoji: "💕", name: "Compost Cupid" });
-  if (actions >= 10) badges.push({ emoji: "♻️", name: "Recycling Romantic" });
-  if (score >= 50) badges.push({ emoji: "🌿", name: "Green Heart" });
-  if (score >= 100) badges.push({ emoji: "💚", name: "Earth Lover" });
-  if (score >= 200) badges.push({ emoji: "🌍", name: "Planet Protector" });
-  if (score >= 500) badges.push({ emoji: "💎", name: "Sustainability Soulmate" });
-  return badges;
-}
-
 export default function DashboardPage() {
-  const { username, user, refreshUser } = useUser();
+  const { username, user: contextUser, refreshUser } = useUser();
   const [activeTab, setActiveTab] = useState<Tab>("stats");
+  const [dashboard, setDashboard] = useState<Dashboard | null>(null);
   const [leaderboard, setLeaderboard] = useState<LeaderboardEntry[]>([]);
   const [pledges, setPledges] = useState<Pledge[]>([]);
   const [pledgeInput, setPledgeInput] = useState("");
@@ -54,17 +44,31 @@ export default function DashboardPage() {
   const [isLoadingLB, setIsLoadingLB] = useState(false);
   const [isLoadingPledges, setIsLoadingPledges] = useState(false);
   const [isPlayingAudio, setIsPlayingAudio] = useState(false);
+  const user = dashboard?.user ?? contextUser;
+
+  // Profile, badges and leaderboard in one call; visitors without a username get the leaderboard alone
+  const loadDashboard = async () => {
+    if (!username) {
+      setDashboard(null);
+      const data = await getLeaderboard(20);
+      setLeaderboard(data.leaderboard);
+      return;
+    }
+    const data = await getDashboard(username, 20);
+    setDashboard(data);
+    setLeaderboard(data.leaderboard);
+  };
 
   useEffect(() => {
-    if (activeTab === "leaderboard") {
+    if (activeTab === "stats" || activeTab === "leaderboard") {
       setIsLoadingLB(true);
-      getLeaderboard(20).then((data) => setLeaderboard(data.leaderboard)).catch(() => {}).finally(() => setIsLoadingLB(false));
+      loadDashboard().catch(() => {}).finally(() => setIsLoadingLB(false));
     }
     if (activeTab === "pledges") {
       setIsLoadingPledges(true);
       getPledges(50).then((data) => setPledges(data.pledges)).catch(() => {}).finally(() => setIsLoadingPledges(false));
     }
-  }, [activeTab]);
+  }, [activeTab, username]);
 
   const handleSubmitPledge = async () => {
     if (!pledgeInput.trim() || !username) return;
@@ -73,7 +77,7 @@ export default function DashboardPage() {
       await createPledge(username, pledgeInput.trim());
       await logScore(username, "pledge", 20, `Pledge: ${pledgeInput.trim().slice(0, 50)}`);
       setPledgeInput("");
-      await refreshUser();
+      await Promise.all([refreshUser(), loadDashboard()]);
       // Refresh pledges
       const data = await getPledges(50);
       setPledges(data.pledges);
@@ -112,8 +116,8 @@ export default function DashboardPage() {
     }
   };
 
+  const achievements = dashboard?.badges ?? [];
   const stage = getSproutStage(user?.total_score || 0);
-  const achievements = getAchievements(user?.total_score || 0, user?.actions_count || 0);
   const nextLevelScore = [50, 100, 200, 500, 1000][stage.level - 1] || 1000;
   const progress = Math.min(((user?.total_score || 0) / nextLevelScore) * 100, 100);
 
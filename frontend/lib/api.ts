@@ -7,6 +7,12 @@ const API_BASE = process.env.NEXT_PUBLIC_API_URL || "http://localhost:8000";
 
 // ── Generic fetch helper ──
 
+export class ApiError extends Error {
+  constructor(message: string, public status: number) {
+    super(message);
+  }
+}
+
 async function apiFetch<T>(
   endpoint: string,
   options?: RequestInit
@@ -17,7 +23,7 @@ async function apiFetch<T>(
   });
   if (!res.ok) {
     const error = await res.json().catch(() => ({ detail: res.statusText }));
-    throw new Error(error.detail || "API request failed");
+    throw new ApiError(error.detail || "API request failed", res.status);
   }
   return res.json();
 }
@@ -39,6 +45,7 @@ export interface ChatResponse {
   route_to_patriotai: boolean;
   patriotai_agent: string | null;
   patriotai_reason: string | null;
+  session_id?: string | null;
 }
 
 export interface ChatMessage {
@@ -65,6 +72,7 @@ export interface LeaderboardEntry {
 }
 
 export interface Pledge {
+  id: string;
   username: string;
   display_name: string;
   pledge_text: string;
@@ -89,6 +97,26 @@ export interface GlobalStats {
   action_breakdown: Record<string, number>;
 }
 
+export interface Badge {
+  emoji: string;
+  name: string;
+}
+
+export interface ScoreActionEntry {
+  action: string;
+  points: number;
+  description: string | null;
+  created_at: string;
+}
+
+export interface Dashboard {
+  user: User;
+  badges: Badge[];
+  recent_actions: ScoreActionEntry[];
+  leaderboard: LeaderboardEntry[];
+  stats: GlobalStats;
+}
+
 // ── API Functions ──
 
 // Snap & Sort
@@ -117,11 +145,29 @@ export async function classifyWasteFile(file: File): Promise<ClassificationResul
 }
 
 // Chat
-export async function sendChatMessage(message: string, history: ChatMessage[] = []): Promise<ChatResponse> {
-  return apiFetch("/api/chat", {
-    method: "POST",
-    body: JSON.stringify({ message, history }),
-  });
+/**
+ * With a session id only the new message is sent. If the server no longer
+ * has that session (restart, eviction, another worker) it answers 409, and
+ * the local history is sent once to seed a new session.
+ */
+export async function sendChatMessage(
+  message: string,
+  history: ChatMessage[] = [],
+  sessionId?: string | null
+): Promise<ChatResponse> {
+  const send = (session_id: string | null, turns: ChatMessage[]): Promise<ChatResponse> =>
+    apiFetch("/api/chat", {
+      method: "POST",
+      body: JSON.stringify({ message, history: turns, session_id }),
+    });
+
+  if (!sessionId) return send(null, history);
+  try {
+    return await send(sessionId, []);
+  } catch (err) {
+    if (err instanceof ApiError && err.status === 409) return send(null, history);
+    throw err;
+  }
 }
 
 // Users
@@ -144,6 +190,11 @@ export async function logScore(username: string, action: string, points: number,
   });
 }
 
+// Dashboard (profile, badges, recent actions, leaderboard and stats in one call)
+export async function getDashboard(username: string, leaderboardLimit: number = 20): Promise<Dashboard> {
+  return apiFetch(`/api/dashboard/${encodeURIComponent(username)}?leaderboard_limit=${leaderboardLimit}`);
+}
+
 // Leaderboard
 export async function getLeaderboard(limit: number = 20): Promise<{ leaderboard: LeaderboardEntry[]; total_entries: number }> {
   return apiFetch(`/api/leaderboard?limit=${limit}`);
@@ -157,8 +208,16 @@ export async function createPledge(username: string, pledgeText: string): Promis
   });
 }
 
-export async function getPledges(limit: number = 50): Promise<{ pledges: Pledge[]; total: number }> {
-  return apiFetch(`/api/pledges?limit=${limit}`);
+export async function getPledges(
+  limit: number = 50,
+  cursor?: string | null
+): Promise<{ pledges: Pledge[]; total: number; next_cursor: string | null }> {
+  const query = cursor ? `&cursor=${encodeURIComponent(cursor)}` : "";
+  return apiFetch(`/api/pledges?limit=${limit}${query}`);
+}
+
+export async function likePledge(pledgeId: string): Promise<{ id: string; likes: number }> {
+  return apiFetch(`/api/pledges/${encodeURIComponent(pledgeId)}/like`, { method: "POST" });
 }
 
 // PatriotAI